@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the whole check pipeline: ``Repo.load()`` then ``Repo.check()``
+
+A synthetic packages-index with thousands of board images is committed to a local git repo,
+their upstreams (ISCAS, OpenWrt, Ubuntu cdimage, FreeBSD, openKylin and GitHub) are served
+by ``benchmarks.local_mirror``, "misc" board images mix GitHub and OpenWrt files. Wall time,
+upstream requests and peak traced memory are reported per stage, every stage runs cold and then
+warm against the caches of the cold run.
+
+    python -m benchmarks.bench_check [-n 3000] [--outdated 0.1] [--pace] [--no-trace] [--draft] [--keep]
+"""
+
+import argparse
+import hashlib
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pygit2
+
+from .local_mirror import GITHUB_OWNER, GITHUB_TAGS, LISTINGS, LocalMirror, install
+
+BRANCH = "main"
+
+MANIFEST = '''format = "v1"
+
+[metadata]
+desc = "Synthetic board image {name}"
+vendor = {{ name = "reimu-bench", eula = "" }}
+
+{distfiles}
+[blob]
+distfiles = [{names}]
+'''
+
+DISTFILE = '''[[distfiles]]
+name = "{name}"
+size = 1048576
+urls = ["{url}"]
+
+[distfiles.checksums]
+sha256 = "{sha256}"
+
+'''
+
+
+def _versions(host: str, pattern: str) -> list[str]:
+    """
+    Release entries of a listing in ``local_mirror.LISTINGS``, oldest first
+    """
+    for p, _, entries in LISTINGS[host]:
+        if p == pattern:
+            return sorted(e for e in entries if e[0].isdigit() or e.startswith("openEuler-"))
+    raise KeyError(pattern)
+
+
+def _gen_urls(style: str, i: int, version: str) -> list[str]:
+    b = "board{:05d}".format(i)
+    if style == "github":
+        return ["https://github.com/{}/{}/releases/download/{}/{}-{}.img.zst"
+                .format(GITHUB_OWNER, b, version, b, version)]
+    if style == "revyos":
+        return ["https://mirror.iscas.ac.cn/revyos/extra/images/{0}/{1}/{2}-{0}-{1}.ext4".format(b, version, p)
+                for p in ("boot", "root")]
+    if style == "openeuler":
+        return ["https://mirror.iscas.ac.cn/openeuler-sig-riscv/openEuler-RISC-V/preview/{}/{}/openEuler-{}.img.zst"
+                .format(version, b, b)]
+    if style == "openwrt":
+        return ["https://downloads.openwrt.org/releases/{0}/targets/{1}/generic/openwrt-{0}-{1}-sysupgrade.img.gz"
+                .format(version, b)]
+    if style == "freebsd":
+        return ["https://download.freebsd.org/releases/riscv/riscv64/ISO-IMAGES/{0}/FreeBSD-{0}-RELEASE-{1}.img.xz"
+                .format(version, b)]
+    if style == "ubuntu":
+        return ["https://cdimage.ubuntu.com/releases/{0}/release/ubuntu-{0}-preinstalled-server-riscv64+{1}.img.xz"
+                .format(version, b)]
+    if style == "misc":
+        # firmware released on GitHub, rootfs from OpenWrt, version is "tag|release"
+        tag, release = version.split("|")
+        return _gen_urls("github", i, tag) + _gen_urls("openwrt", i, release)
+    return ["https://releases.openkylin.top/{0}/openKylin-{0}-{1}-riscv64.img.xz".format(version, b)]
+
+
+# style: upstream versions, oldest first
+STYLES = {
+    "github": list(reversed(GITHUB_TAGS)),
+    "revyos": _versions("mirror.iscas.ac.cn", r"/revyos/extra/images/[^/]+/"),
+    "openeuler": _versions("mirror.iscas.ac.cn", r"/openeuler-sig-riscv/openEuler-RISC-V/preview/"),
+    "openwrt": _versions("downloads.openwrt.org", r"/releases/"),
+    "freebsd": _versions("download.freebsd.org", r"/releases/riscv/riscv64/ISO-IMAGES/"),
+    "ubuntu": _versions("cdimage.ubuntu.com", r"/releases/"),
+    "openkylin": _versions("releases.openkylin.top", r"/"),
+}
+STYLES["misc"] = ["{}|{}".format(t, r) for t, r in zip(STYLES["github"][-3:], STYLES["openwrt"][-3:])]
+
+
+def gen_manifest(style: str, i: int, version: str) -> str:
+    distfiles = ""
+    names = []
+    for url in _gen_urls(style, i, version):
+        name = url.rsplit("/", 1)[1]
+        names.append('"{}"'.format(name))
+        distfiles += DISTFILE.format(name=name, url=url, sha256=hashlib.sha256(url.encode("utf-8")).hexdigest())
+    return MANIFEST.format(name="bench-{}-{:05d}".format(style, i), distfiles=distfiles, names=", ".join(names))
+
+
+def gen_packages_index(path: Path, n: int, outdated: float, seed: int = 0) -> pygit2.Repository:
+    """
+    Commit ``n`` board images to a new git repo, each has an old and a current manifest.
+    ``outdated`` of them do not use the latest upstream version.
+    """
+    rnd = random.Random(seed)
+    repo = pygit2.init_repository(str(path), bare=True, initial_head=BRANCH)
+    styles = list(STYLES.keys())
+
+    boards = repo.TreeBuilder()
+    for i in range(n):
+        style = styles[i % len(styles)]
+        versions = STYLES[style]
+        current = versions[-1] if rnd.random() >= outdated else rnd.choice(versions[:-1])
+        manifests = repo.TreeBuilder()
+        for mf, version in (("0.1.0.toml", versions[0]), ("1.0.0.toml", current)):
+            manifests.insert(mf, repo.create_blob(gen_manifest(style, i, version).encode("utf-8")),
+                             pygit2.GIT_FILEMODE_BLOB)
+        boards.insert("bench-{}-{:05d}".format(style, i), manifests.write(), pygit2.GIT_FILEMODE_TREE)
+
+    manifests = repo.TreeBuilder()
+    manifests.insert("board-image", boards.write(), pygit2.GIT_FILEMODE_TREE)
+    root = repo.TreeBuilder()
+    root.insert("manifests", manifests.write(), pygit2.GIT_FILEMODE_TREE)
+    sig = pygit2.Signature("reimu-bench", "reimu-bench@localhost", 0, 0)
+    repo.create_commit("refs/heads/" + BRANCH, sig, sig, "Synthetic packages-index", root.write(), [])
+    return repo
+
+
+def write_config(path: Path, index: Path, mirror: LocalMirror, bare: bool, ttl: int) -> dict:
+    path.mkdir(parents=True, exist_ok=True)
+    cfg = {"config_file": path.joinpath("config.toml"),
+           "mirror_file": path.joinpath("mirrors.toml"),
+           "jenkins_file": path.joinpath("jenkins.toml")}
+    cfg["config_file"].write_text('''[github]
+github_token = "reimu-bench"
+issue_to = "{owner}/reimu-bench"
+api_url = "{api}"
+
+[ruyi_repo]
+repo = "{index}"
+branch = "{branch}"
+bare = {bare}
+
+[check]
+ttl = {ttl}
+
+[http]
+retries = 0
+'''.format(owner=GITHUB_OWNER, api=mirror.github_api_url, index=index, branch=BRANCH,
+           bare="true" if bare else "false", ttl=ttl))
+    shutil.copy(Path(__file__).parent.parent.joinpath("mirrors.toml"), cfg["mirror_file"])
+    cfg["jenkins_file"].write_text("")
+    return {k: str(v) for k, v in cfg.items()}
+
+
+class Stages:
+    """
+    Run named stages, recording wall time, upstream requests and peak traced memory
+    """
+
+    def __init__(self, mirror: LocalMirror, trace: bool):
+        self.mirror = mirror
+        self.trace = trace
+        self.results = []
+
+    def run(self, name: str, func):
+        self.mirror.reset()
+        if self.trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            func()
+        finally:
+            cost = time.perf_counter() - start
+            peak = 0
+            if self.trace:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            requests = self.mirror.stats()["requests"]
+            self.results.append((name, cost, sum(requests.values()), requests, peak))
+
+    def report(self):
+        print("\n{:<22} {:>10} {:>9} {:>11}  requests by host".format("stage", "wall", "requests", "peak"))
+        for name, cost, total, requests, peak in self.results:
+            by_host = ", ".join("{} {}".format(h, c) for h, c in sorted(requests.items()))
+            print("{:<22} {:>9.3f}s {:>9} {:>7.1f} MiB  {}".format(
+                name, cost, total, peak / 1048576 if self.trace else float("nan"), by_host))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Repo.load() and Repo.check() against a local mirror")
+    parser.add_argument("-n", type=int, default=3000, help="synthetic board images")
+    parser.add_argument("--outdated", type=float, default=0.1, help="ratio of board images need update")
+    parser.add_argument("--worktree", action="store_true", help="clone packages-index with a working tree")
+    parser.add_argument("--ttl", type=int, default=0, help="[check] ttl, snapshots of the cold run are reused")
+    parser.add_argument("--pace", action="store_true", help="keep pacing of GitHub requests")
+    parser.add_argument("--no-trace", action="store_true",
+                        help="do not trace memory, tracing slows every stage down")
+    parser.add_argument("--draft", action="store_true", help="draft manifests of outdated board images at last")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary directory")
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="reimu-bench-"))
+    mirror = LocalMirror()
+    mirror.start()
+    try:
+        start = time.perf_counter()
+        gen_packages_index(tmp.joinpath("packages-index.git"), args.n, args.outdated)
+        print("Generate {} board images cost {:.3f}s in {}".format(args.n, time.perf_counter() - start, tmp))
+
+        # import after the server process started, it should not inherit anything
+        from config.loader import reimu_config
+        from repo.loader import ruyi_repo
+        from utils.github_operation import gh_op
+        from utils.github_scheduler import GithubScheduler
+        from utils.http_session import http_session
+
+        reimu_config.cache_dir = tmp.joinpath("cache")
+        install(http_session, mirror)
+        cfg = write_config(tmp.joinpath("config"), tmp.joinpath("packages-index.git"), mirror,
+                           not args.worktree, args.ttl)
+
+        stages = Stages(mirror, not args.no_trace)
+        stages.run("config", lambda: reimu_config.load(**cfg))
+        if not args.pace:
+            # GitHub requests are paced for api.github.com, not for the local server
+            GithubScheduler.WRITE_INTERVAL = 0.0
+            gh_op.init(reimu_config.github_token, reimu_config.cache_dir, reimu_config.github_api_url,
+                       seconds_between_requests=None, seconds_between_writes=None)
+        results = []
+        for run in ("cold", "warm"):
+            stages.run("load ({})".format(run), ruyi_repo.load)
+            stages.run("check_urls ({})".format(run), lambda: (ruyi_repo.check_begin(), ruyi_repo.check_urls()))
+            stages.run("check_upstreams ({})".format(run),
+                       lambda: (results.__setitem__(slice(None), ruyi_repo.check_upstreams(
+                           ruyi_repo.repo_board_images())), ruyi_repo.check_end()))
+        if args.draft:
+            from repo.manifest_draft import manifest_drafter
+
+            # files of the local mirror are 1 MiB, use smaller ranges
+            reimu_config.check_draft_chunk_size = 256 << 10
+            stages.run("draft", lambda: (ruyi_repo.verify(results, only_new=False),
+                                         manifest_drafter.draft_all(ruyi_repo.board_image_raw, results,
+                                                                    tmp.joinpath("drafts"))))
+        stages.report()
+        print("\nIssues on the local GitHub: {}".format(mirror.stats()["issues"]))
+    finally:
+        mirror.stop()
+        if args.keep:
+            print("Keep {}".format(tmp))
+        else:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Import time of each entry point, measured by ``python -X importtime`` in a fresh interpreter
+
+Entry points only import their modules here, ``__main__`` blocks do not run. Heavy third
+party packages pulled in at import time are listed, they should be loaded lazily.
+
+    python -m benchmarks.bench_import [-r 5] [--save import.json] [--compare import.json]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+ENTRY_POINTS = {
+    "reimu_pages": "import reimu_pages",
+    "reimu_mugen_test": "import reimu_mugen_test",
+    "reimu_check_latest": "import reimu_check_latest",
+    # what reimu_check_latest imports after its arguments are parsed
+    "reimu_check_latest:run": "import reimu_check_latest, repo.loader",
+}
+
+HEAVY = ["github", "pygit2", "semver", "requests", "urllib3", "jenkins", "flask", "bs4", "yaml"]
+
+
+def measure(code: str) -> (float, list[str], int):
+    """
+    :return: cumulative import time in ms, heavy packages imported, modules imported
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    total = 0
+    modules = 0
+    heavy = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            # header line
+            continue
+        modules += 1
+        if not name.startswith("  "):
+            # top level import, nested ones are in its cumulative time
+            total += int(cumulative)
+        if name.strip() in HEAVY:
+            heavy.append(name.strip())
+    return total / 1000, sorted(heavy), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import time of entry points")
+    parser.add_argument("-r", type=int, default=5, help="runs of each entry point, the fastest one is reported")
+    parser.add_argument("--save", default="", help="save results to a json file")
+    parser.add_argument("--compare", default="", help="compare with results saved by --save")
+    args = parser.parse_args()
+
+    base, _, _ = min(measure("pass") for _ in range(args.r))
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r") as fp:
+            baseline = json.load(fp)
+
+    results = {}
+    print("{:<24} {:>10} {:>8}  heavy packages".format("entry point", "import", "modules"))
+    for name, code in ENTRY_POINTS.items():
+        cost, heavy, modules = min(measure(code) for _ in range(args.r))
+        cost -= base
+        results[name] = {"ms": round(cost, 1), "modules": modules, "heavy": heavy}
+        line = "{:<24} {:>8.1f}ms {:>8}  {}".format(name, cost, modules, ", ".join(heavy) if heavy else "-")
+        if name in baseline.keys():
+            line += "  ({:+.1f}ms vs saved)".format(cost - baseline[name]["ms"])
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Streaming listing extractor against BeautifulSoup DOM parsing on large listing pages
+
+    python -m benchmarks.bench_listing_parser [-n 5000] [--listing page.html --style freebsd]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from repo.adapters.listing_parser import ListingExtractor
+
+STYLES = {
+    # style: (extractor arguments, synthetic row template)
+    "iscas": ({"container": "tr", "first_cell": True},
+              '<tr><td class="link"><a href="{0}/" title="{0}">{0}/</a></td>'
+              '<td class="size">-</td><td class="date">2024-Jun-01 18:09</td></tr>\n'),
+    "openwrt": ({"container": "tr"},
+                '<tr><td class="n"><a href="{0}/">{0}</a>/</td><td class="s">-</td>'
+                '<td class="d">Fri Jun 14 12:00:00 2024</td></tr>\n'),
+    "freebsd": ({"container": "tr"},
+                '<tr><td class="link"><a href="{0}/" title="{0}">{0}/</a></td><td class="size">-</td>'
+                '<td class="date">2024-Jun-04 21:29</td></tr>\n'),
+    "ubuntu": ({"container": "li", "strip": True},
+               '<li><a href="{0}/"> {0}/</a></li>\n'),
+    "openkylin": ({},
+                  '<a href="{0}/">{0}/</a>                                  04-Jun-2024 08:00       -\n'),
+}
+
+
+def render_listing(style: str, names: list[str]) -> str:
+    """
+    Listing page of directories ``names`` in the markup of a mirror style
+    """
+    row = STYLES[style][1]
+    body = "".join(row.format(name) for name in names)
+    if style in ("ubuntu",):
+        return "<html><body><ul>\n" + body + "</ul></body></html>"
+    if style in ("openkylin",):
+        return "<html><body><pre>\n" + body + "</pre></body></html>"
+    return "<html><body><table>\n" + body + "</table></body></html>"
+
+
+def gen_listing(style: str, n: int) -> str:
+    return render_listing(style, ["{}.{}.{}".format(i // 100, i // 10 % 10, i % 10) for i in range(n)])
+
+
+def soup_parse(style: str, text: str) -> list[str]:
+    """
+    DOM based parsers as they were in mirror_adapter before the streaming extractor
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(text, 'html.parser')
+    ans = []
+    if style == "iscas":
+        for tr in soup.find_all("tr"):
+            a = tr.contents[0].a
+            if a is not None:
+                ans.append(a.text)
+    elif style == "ubuntu":
+        for li in soup.find_all("li"):
+            if li.a is not None:
+                ans.append(li.a.text.strip())
+    elif style == "openkylin":
+        for a in soup.find_all("a"):
+            ans.append(a.text)
+    else:
+        for tr in soup.find_all("tr"):
+            if tr.a is not None:
+                ans.append(tr.a.text)
+    return ans
+
+
+def stream_parse(style: str, text: str) -> list[str]:
+    return ListingExtractor(**STYLES[style][0]).feed_text(text)
+
+
+def measure(func, style: str, text: str) -> (list[str], float, int):
+    start = time.perf_counter()
+    ans = func(style, text)
+    cost = time.perf_counter() - start
+
+    # tracing slows parsing down a lot, measure memory in another pass
+    tracemalloc.start()
+    func(style, text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ans, cost, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark listing page parsers")
+    parser.add_argument("-n", type=int, default=5000, help="entries of synthetic listings")
+    parser.add_argument("--listing", default="", help="recorded listing page, instead of synthetic ones")
+    parser.add_argument("--style", default="", choices=[""] + list(STYLES.keys()))
+    args = parser.parse_args()
+
+    pages = []
+    if args.listing:
+        if not args.style:
+            parser.error("--style is required with --listing")
+        with open(args.listing, "r", errors="replace") as fp:
+            pages.append((args.style, fp.read()))
+    else:
+        for style in STYLES.keys():
+            pages.append((style, gen_listing(style, args.n)))
+
+    try:
+        import bs4  # noqa: F401
+        with_soup = True
+    except ImportError:
+        with_soup = False
+        print("bs4 not installed, only the streaming extractor is measured")
+
+    for style, text in pages:
+        entries, cost, peak = measure(stream_parse, style, text)
+        line = "{:<10} {:>8.1f} KiB {:>7} entries | stream {:.3f}s peak {:.1f} MiB".format(
+            style, len(text) / 1024, len(entries), cost, peak / 1048576)
+        if with_soup:
+            soup_entries, soup_cost, soup_peak = measure(soup_parse, style, text)
+            line += " | soup {:.3f}s peak {:.1f} MiB | {}".format(
+                soup_cost, soup_peak / 1048576, "same" if soup_entries == entries else "DIFFERENT")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+URL classification throughput on a synthetic url corpus
+
+    python -m benchmarks.bench_mirror_rules [-n 100000] [--mirror-file mirrors.toml]
+"""
+
+import argparse
+import random
+import time
+import tomllib
+
+from repo.mirror_rules import MirrorRules
+
+URL_TEMPLATES = [
+    "https://mirror.iscas.ac.cn/revyos/extra/images/{board}/{date}/root-{board}-{date}_180941.ext4.zst",
+    "https://mirror.iscas.ac.cn/openEuler-RISC-V/testing/{ver}/v1/{board}/openEuler-{ver}-{board}-boot.ext4.zst",
+    "https://github.com/{owner}/{board}-sdk/releases/download/v{ver}/{board}-v{ver}.img.zip",
+    "https://downloads.openwrt.org/releases/{ver}/targets/{board}/generic/openwrt-{ver}-{board}-sdcard.img.gz",
+    "https://download.freebsd.org/releases/riscv/riscv64/ISO-IMAGES/{ver}/FreeBSD-{ver}-RELEASE-riscv64.iso.xz",
+    "https://cdimage.ubuntu.com/releases/{ver}/release/ubuntu-{ver}-preinstalled-server-riscv64+{board}.img.xz",
+    "https://releases.openkylin.top/{ver}/openKylin-{ver}-{board}-riscv64.img.xz",
+    # unsupported hosts
+    "https://example.com/{owner}/{board}/{ver}/image-{date}.img",
+    "https://mirror.iscas.ac.cn/unknown/{board}/{ver}/{date}.img",
+]
+
+
+def gen_urls(n: int, seed: int = 0) -> list[str]:
+    rnd = random.Random(seed)
+    urls = []
+    for _ in range(n):
+        urls.append(rnd.choice(URL_TEMPLATES).format(
+            board="board{}".format(rnd.randrange(200)),
+            owner="owner{}".format(rnd.randrange(50)),
+            date="2024{:02}{:02}".format(rnd.randrange(1, 13), rnd.randrange(1, 29)),
+            ver="{}.{}.{}".format(rnd.randrange(30), rnd.randrange(10), rnd.randrange(10))))
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mirror rule url classification")
+    parser.add_argument("-n", type=int, default=100000, help="number of urls")
+    parser.add_argument("--mirror-file", default="mirrors.toml")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.mirror_file, "rb") as fp:
+        mirrors = tomllib.load(fp)
+
+    start = time.perf_counter()
+    rules = MirrorRules()
+    rules.load(mirrors)
+    compile_time = time.perf_counter() - start
+
+    urls = gen_urls(args.n)
+    best = None
+    valid = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        valid = sum(1 for u in urls if rules.classify(u).valid)
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+
+    print("compile rules: {:.3f} ms".format(compile_time * 1000))
+    print("classify {} urls ({} valid): best {:.3f} s, {:.0f} urls/s"
+          .format(len(urls), valid, best, len(urls) / best))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Local stand-in of upstream mirrors and the GitHub API for offline benchmarks.
+
+One threaded http server serves every upstream host under ``/<host>/<path>``:
+autoindex pages in the markup of each mirror adapter, files under their release directories,
+GitHub release downloads, GraphQL release queries and the REST endpoints used for issues. ``LocalMirrorAdapter`` rewrites requests of
+``http_session`` to this server, so the checked urls keep their real hosts.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+from .bench_listing_parser import render_listing
+
+GITHUB_API = "api.github.com"
+GITHUB_OWNER = "reimu-bench"
+
+# newest first
+GITHUB_TAGS = ["v2.1.0", "v2.0.1", "v2.0.0", "v1.3.0", "v1.2.0", "v1.1.0", "v1.0.0"]
+
+# host: [(listing path pattern, listing style, entries)]
+LISTINGS = {
+    "mirror.iscas.ac.cn": [
+        (r"/revyos/extra/images/[^/]+/", "iscas",
+         ["Parent directory", "20231210", "20240111", "20240327", "20240601", "20240720", "20241230"]),
+        (r"/openeuler-sig-riscv/openEuler-RISC-V/preview/", "iscas",
+         ["Parent directory", "openEuler-23.03-V1-riscv64", "openEuler-23.09-V1-riscv64",
+          "openEuler-24.03-V1-riscv64"]),
+    ],
+    "downloads.openwrt.org": [
+        (r"/releases/", "openwrt",
+         ["21.02.7", "22.03.5", "22.03.6", "23.05.0", "23.05.2", "23.05.3", "faillogs", "packages-23.05"]),
+    ],
+    "download.freebsd.org": [
+        (r"/releases/riscv/riscv64/ISO-IMAGES/", "freebsd", ["13.2", "13.3", "14.0", "14.1"]),
+    ],
+    "cdimage.ubuntu.com": [
+        (r"/releases/", "ubuntu", ["22.04", "23.10", "24.04", "24.10", "streams"]),
+    ],
+    "releases.openkylin.top": [
+        (r"/", "openkylin", ["1.0", "1.0.1", "1.0.2", "2.0", "iso"]),
+    ],
+}
+_LISTINGS = {h: [(re.compile(p + "$"), style, entries) for p, style, entries in ls] for h, ls in LISTINGS.items()}
+# files under release directories of listings: (release, path in release)
+_FILES = {h: [(re.compile(p + "([^/]+)/(.*[^/])$"), entries) for p, _, entries in ls] for h, ls in LISTINGS.items()}
+_FILES["github.com"] = [(re.compile(r"/[^/]+/[^/]+/releases/download/([^/]+)/(.*[^/])$"), GITHUB_TAGS)]
+
+# size of every file served
+FILE_SIZE = 1 << 20
+
+
+def file_content(path: str) -> bytes:
+    """
+    :param path: host and path of a served file, such as "github.com/owner/repo/releases/download/v1/a.img"
+    """
+    block = hashlib.sha256(path.encode("utf-8")).digest() * 128
+    return block * (FILE_SIZE // len(block))
+
+
+class _State:
+    """
+    Request counters and created issues of the server process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.issues = {}
+
+    def count(self, host: str):
+        with self.lock:
+            self.requests[host] = self.requests.get(host, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, do not wait for delayed acks
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code: int, body: bytes = b"", content_type: str = "text/html", headers: dict = None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, code: int, obj):
+        self._send(code, json.dumps(obj).encode("utf-8"), "application/json",
+                   {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4999",
+                    "X-RateLimit-Reset": str(int(time.time()) + 3600)})
+
+    def _body(self) -> dict:
+        n = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(n)) if n else {}
+
+    def _route(self):
+        split = urlsplit(self.path)
+        if split.path.startswith("/_bench/"):
+            return self._control(split.path)
+
+        host, _, path = split.path[1:].partition("/")
+        path = "/" + path
+        _Handler.state.count(host)
+        if host == GITHUB_API:
+            return self._github(path, parse_qs(split.query))
+        for pattern, style, entries in _LISTINGS.get(host, []):
+            if pattern.match(path):
+                return self._listing(style, entries)
+        for pattern, entries in _FILES.get(host, []):
+            m = pattern.match(path)
+            if m is not None and m.group(1) in entries:
+                return self._file(host + path)
+        self._send(404)
+
+    def _control(self, path: str):
+        state = _Handler.state
+        with state.lock:
+            ans = {"requests": dict(state.requests), "issues": len(state.issues)}
+            if path == "/_bench/reset":
+                state.requests = {}
+        self._json(200, ans)
+
+    def _listing(self, style: str, entries: list[str]):
+        body = render_listing(style, entries).encode("utf-8")
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, headers={"ETag": etag})
+        self._send(200, body, headers={"ETag": etag})
+
+    def _file(self, path: str):
+        """
+        Deterministic content of FILE_SIZE bytes, a single byte range is supported
+        """
+        start, end = 0, FILE_SIZE - 1
+        m = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if m is not None:
+            start, end = int(m.group(1)), min(int(m.group(2)) if m.group(2) else end, end)
+        self.send_response(206 if m is not None else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if m is not None:
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end, FILE_SIZE))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(file_content(path)[start:end + 1])
+
+    @staticmethod
+    def _release(name: str, tag: str) -> dict:
+        return {"tagName": tag, "publishedAt": "2024-06-01T00:00:00Z",
+                "releaseAssets": {"nodes": [{"name": "{}-{}.img.zst".format(name, tag)}]}}
+
+    def _graphql(self):
+        variables = self._body().get("variables", {})
+        data = {"rateLimit": {"cost": 1, "remaining": 4999}}
+        i = 0
+        while "o{}".format(i) in variables.keys():
+            name = variables["n{}".format(i)]
+            data["r{}".format(i)] = {"releases": {"pageInfo": {"hasNextPage": False},
+                                                  "nodes": [self._release(name, t) for t in GITHUB_TAGS]}}
+            i += 1
+        self._json(200, {"data": data})
+
+    def _issue(self, base: str, number: int) -> dict:
+        title, state, body = _Handler.state.issues[number]
+        return {"number": number, "title": title, "state": state, "body": body,
+                "url": "{}/issues/{}".format(base, number)}
+
+    def _github(self, path: str, query: dict):
+        api = "http://{}:{}/{}".format(*self.server.server_address, GITHUB_API)
+        state = _Handler.state
+        if path == "/graphql" and self.command == "POST":
+            return self._graphql()
+        if path == "/user":
+            return self._json(200, {"login": GITHUB_OWNER, "name": GITHUB_OWNER, "url": api + "/user"})
+
+        m = re.match(r"/repos/([^/]+)/([^/]+)(/.*)?$", path)
+        if m is None:
+            return self._json(404, {"message": "Not Found"})
+        owner, name, sub = m.group(1), m.group(2), m.group(3) or ""
+        base = "{}/repos/{}/{}".format(api, owner, name)
+        if sub == "":
+            return self._json(200, {"name": name, "full_name": owner + "/" + name, "url": base,
+                                    "owner": {"login": owner}})
+        if sub == "/releases":
+            page = int(query.get("page", ["1"])[0])
+            return self._json(200, [{"tag_name": t, "url": "{}/releases/{}".format(base, t)}
+                                    for t in (GITHUB_TAGS if page == 1 else [])])
+        if sub == "/issues" and self.command == "GET":
+            with state.lock:
+                return self._json(200, [self._issue(base, n) for n in sorted(state.issues.keys())])
+        if sub == "/issues" and self.command == "POST":
+            req = self._body()
+            with state.lock:
+                number = len(state.issues) + 1
+                state.issues[number] = (req["title"], "open", req.get("body", ""))
+                return self._json(201, self._issue(base, number))
+
+        m = re.match(r"/issues/([0-9]+)(/comments)?$", sub)
+        if m is None or int(m.group(1)) not in state.issues.keys():
+            return self._json(404, {"message": "Not Found"})
+        number = int(m.group(1))
+        if m.group(2):
+            return self._json(201, {"id": number, "body": self._body().get("body", "")})
+        with state.lock:
+            if self.command == "PATCH":
+                req = self._body()
+                title, st, body = state.issues[number]
+                state.issues[number] = (title, req.get("state", st), req.get("body", body))
+            return self._json(200, self._issue(base, number))
+
+    do_GET = do_HEAD = do_POST = do_PATCH = _route
+
+
+def _serve(port_queue):
+    _Handler.state = _State()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class LocalMirror:
+    """
+    Server in a child process, its allocations and GIL time stay out of benchmark results
+    """
+
+    def __init__(self):
+        self.process = None
+        self.port = 0
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:{}".format(self.port)
+
+    @property
+    def github_api_url(self) -> str:
+        return "{}/{}".format(self.url, GITHUB_API)
+
+    def start(self):
+        ctx = multiprocessing.get_context("spawn")
+        q = ctx.Queue()
+        self.process = ctx.Process(target=_serve, args=(q,), daemon=True)
+        self.process.start()
+        self.port = q.get(timeout=30)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def _control(self, action: str) -> dict:
+        import requests
+        return requests.get("{}/_bench/{}".format(self.url, action), proxies={"http": None}).json()
+
+    def stats(self) -> dict:
+        """
+        :return: {"requests": {host: int}, "issues": int}
+        """
+        return self._control("stats")
+
+    def reset(self) -> dict:
+        """
+        Reset request counters
+        :return: counters before reset
+        """
+        return self._control("reset")
+
+
+class LocalMirrorAdapter(HTTPAdapter):
+    """
+    Transport adapter sending requests of any host to ``/<host>/<path>`` of the local mirror
+    """
+
+    def __init__(self, mirror: LocalMirror, **kwargs):
+        self.mirror = mirror
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        split = urlsplit(request.url)
+        if split.hostname != "127.0.0.1":
+            request.url = "{}/{}{}".format(self.mirror.url, split.hostname,
+                                           split.path + ("?" + split.query if split.query else ""))
+        kwargs["proxies"] = {}
+        return super().send(request, **kwargs)
+
+
+def install(session, mirror: LocalMirror):
+    """
+    Route all sessions of ``HttpSession`` ``session`` to ``mirror``
+    """
+    new_session = session._new_session
+
+    def _new_session():
+        s = new_session()
+        # keep retry settings of the default adapter
+        adapter = LocalMirrorAdapter(mirror, pool_connections=1, pool_maxsize=session.pool_size,
+                                     max_retries=s.get_adapter("https://").max_retries)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        return s
+
+    session._new_session = _new_session
+    session.configure(session.pool_size, session.connect_timeout, session.read_timeout,
+                      session.retries, session.backoff)
@@ -5,7 +5,6 @@ from pathlib import Path
 
 from utils.auto_loader import auto_load, auto_store
 from utils.errors import AssertException
-from utils.github_operation import gh_op
 from utils.logger import logger
 
 
@@ -25,12 +24,42 @@ class Config:
 
         self.github_token = ""
         self.issue_to = ""
+        # REST api root, GraphQL endpoint is derived from it
+        self.github_api_url = "https://api.github.com"
 
         self.ruyi_repo = "https://github.com/ruyisdk/packages-index.git"
         self.ruyi_repo_branch = "main"
+        # read manifests from git objects, no working tree checkout
+        self.ruyi_repo_bare = False
         self.ruyi_repo_mirrors = {}
         self.youmu_jenkins = {}
 
+        # upstream check concurrency
+        self.check_workers = 8
+        self.check_host_workers = 2
+        # skip upstreams checked within ttl seconds, 0 to always check
+        self.check_ttl = 0
+        # probe files of the latest release before reporting it
+        self.check_verify = True
+        self.check_verify_workers = 8
+        # request the next mirror of a distfile when the first one is slower than this, 0 to disable
+        self.check_hedge_delay = 1.0
+        # manifest drafts: parallel range requests per file and bytes of each range
+        self.check_draft_workers = 4
+        self.check_draft_chunk_size = 8 << 20
+
+        # watch mode schedule, in seconds
+        self.watch_interval = 3600
+        self.watch_jitter = 0.1
+        self.watch_max_backoff = 6 * 3600
+        self.watch_index_interval = 600
+
+        # http session settings
+        self.http_pool_size = 4
+        self.http_connect_timeout = 10.0
+        self.http_read_timeout = 60.0
+        self.http_retries = 3
+
         self.reimu_status = {'version': "0.0.0", "date": "19700101", "testing": False, "tested": False}
 
         self.tmpdir = Path("/tmp/ruyi_reimu")
@@ -85,7 +114,10 @@ class Config:
         if status is not None:
             auto_store(self.check_cache_status(self.reimu_status["version"]), status)
 
-    def load(self, config_file="", mirror_file="", jenkins_file=""):
+    def load(self, config_file="", mirror_file="", jenkins_file="", clients=True):
+        """
+        :param clients: set up http session and GitHub client, their dependencies are only imported here
+        """
         self.config_file = self.check_configuration_file() if config_file == "" else Path(config_file)
         self.mirror_file = self.check_mirror_file() if mirror_file == "" else Path(mirror_file)
         self.jenkins_file = self.check_jenkins_file() if jenkins_file == "" else Path(jenkins_file)
@@ -102,6 +134,8 @@ class Config:
         self.youmu_jenkins = auto_load(self.jenkins_file)
         self.github_token = config_dict["github"]["github_token"]
         self.issue_to = config_dict["github"]["issue_to"]
+        if "api_url" in config_dict["github"].keys():
+            self.github_api_url = config_dict["github"]["api_url"].rstrip("/")
 
         if "ruyi_repo" not in config_dict.keys():
             logger.info("No ruyi_repo configration found, use default repo")
@@ -115,6 +149,41 @@ class Config:
                 logger.info("No ruyi_repo.branch configration found, use default branch " + self.ruyi_repo_branch)
             else:
                 self.ruyi_repo_branch = ruyi_repo["branch"]
+            if "bare" in ruyi_repo.keys():
+                self.ruyi_repo_bare = bool(ruyi_repo["bare"])
+        if "check" not in config_dict.keys():
+            logger.info("No check configuration found, use default settings")
+        else:
+            check = config_dict["check"]
+            if "workers" in check.keys():
+                self.check_workers = max(1, int(check["workers"]))
+            if "host_workers" in check.keys():
+                self.check_host_workers = max(1, int(check["host_workers"]))
+            if "ttl" in check.keys():
+                self.check_ttl = max(0, int(check["ttl"]))
+            if "verify" in check.keys():
+                self.check_verify = bool(check["verify"])
+            if "verify_workers" in check.keys():
+                self.check_verify_workers = max(1, int(check["verify_workers"]))
+            if "hedge_delay" in check.keys():
+                self.check_hedge_delay = max(0.0, float(check["hedge_delay"]))
+            if "draft_workers" in check.keys():
+                self.check_draft_workers = max(1, int(check["draft_workers"]))
+            if "draft_chunk_size" in check.keys():
+                # in MiB
+                self.check_draft_chunk_size = max(64 << 10, int(float(check["draft_chunk_size"]) * (1 << 20)))
+        if "watch" in config_dict.keys():
+            watch = config_dict["watch"]
+            self.watch_interval = max(60, int(watch.get("interval", self.watch_interval)))
+            self.watch_jitter = min(0.5, max(0.0, float(watch.get("jitter", self.watch_jitter))))
+            self.watch_max_backoff = max(60, int(watch.get("max_backoff", self.watch_max_backoff)))
+            self.watch_index_interval = max(60, int(watch.get("index_interval", self.watch_index_interval)))
+        if "http" in config_dict.keys():
+            http = config_dict["http"]
+            self.http_pool_size = max(1, int(http.get("pool_size", self.http_pool_size)))
+            self.http_connect_timeout = float(http.get("connect_timeout", self.http_connect_timeout))
+            self.http_read_timeout = float(http.get("read_timeout", self.http_read_timeout))
+            self.http_retries = max(0, int(http.get("retries", self.http_retries)))
         if "sys" not in config_dict.keys():
             logger.info("No system configuration found, use default settings")
         else:
@@ -160,7 +229,13 @@ class Config:
         t.touch()
         t.unlink()
 
-        gh_op.init(self.github_token)
+        if clients:
+            from utils.github_operation import gh_op
+            from utils.http_session import http_session
+
+            http_session.configure(self.http_pool_size, self.http_connect_timeout, self.http_read_timeout,
+                                   self.http_retries)
+            gh_op.init(self.github_token, self.cache_dir, self.github_api_url)
 
         self._ready = True
         logger.info("Configuration load done.\n\n")
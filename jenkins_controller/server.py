@@ -5,7 +5,6 @@ import xml.etree.ElementTree as ElementTree
 
 from config.loader import reimu_config
 from utils.errors import AssertException
-from utils.github_operation import gh_op
 from utils.logger import logger
 
 from .script import ScriptGenerator
@@ -13,9 +12,12 @@ from .script import ScriptGenerator
 
 class JenkinsServer:
     FOLDER_NAME = "ruyi-reimu-mugen-auto-test"
+    # recent builds of each job fetched by one status poll, running and just started builds are among them
+    POLL_BUILDS = 8
 
     def __init__(self):
-        self.server = jenkins.Jenkins(" ")
+        # created by load(), nothing connects at import time
+        self.server = None
         self.user = "IDK"
         self.version = "IDK"
 
@@ -150,6 +152,8 @@ class JenkinsServer:
 
         # New test
         if not self.ruyi_testing:
+            from utils.github_operation import gh_op
+
             release = gh_op.get_repo_latest_release("ruyisdk/ruyi")
             tag = release.tag_name
             if self.ruyi_version != tag:
@@ -200,11 +204,15 @@ class JenkinsServer:
         log_delay = 0
 
         while self.queued_platforms or self.configured_platforms or self.testing_platforms:
+            # states of all jobs in one request, instead of one request per platform
+            builds = self._jenkins_poll() if self.testing_platforms or self.configured_platforms else {}
+
             # check testing queue
             end_queue = []
             end_status = []
             for i in range(0, len(self.testing_platforms)):
-                end, info = self._jenkins_job_end(self.testing_platforms[i], self.testing_platforms_info[i]["number"])
+                end, info = self._jenkins_job_end(self.testing_platforms[i], self.testing_platforms_info[i]["number"],
+                                                  builds)
                 if end:
                     end_queue.append(i)
                     end_status.append(info["result"] == "SUCCESS")
@@ -291,10 +299,10 @@ class JenkinsServer:
 
                 self._status_store()
 
-            # check build started
+            # check build started, jobs configured in this tick are not polled yet
             testing_queue = []
             for p in self.configured_platforms:
-                info = self._jenkins_job_check_started(p[2])
+                info = self._jenkins_job_check_started(p[2], p[0], builds)
                 if info:
                     testing_queue.append((p, info))
             for t in testing_queue:
@@ -406,7 +414,40 @@ class JenkinsServer:
         job_name = "{}/{}".format(JenkinsServer.FOLDER_NAME, job_name)
         return self.server.build_job(job_name)
 
-    def _jenkins_job_check_started(self, bid: int) -> dict:
+    def _jenkins_poll(self) -> dict | None:
+        """
+        Recent builds of all jobs in folder by one tree-filtered json api request
+        :return: {job_name: [{"number": int, "queueId": int, "url": str, "inProgress": bool, "result": str}]},
+                 None if poll failed
+        """
+        self._new_server()
+
+        tree = "jobs[name,builds[number,queueId,url,building,inProgress,result]{{0,{}}}]".format(
+            JenkinsServer.POLL_BUILDS)
+        try:
+            info = self.server.get_info("job/" + JenkinsServer.FOLDER_NAME, "?tree=" + tree)
+        except Exception as e:
+            logger.warn("Poll jenkins job folder {} failed, check jobs one by one: {}"
+                        .format(JenkinsServer.FOLDER_NAME, e))
+            return None
+
+        ans = {}
+        for j in info.get("jobs", []):
+            ans[j["name"]] = j.get("builds") or []
+        return ans
+
+    def _jenkins_job_check_started(self, bid: int, job_name: str = "", builds: dict | None = None) -> dict:
+        """
+        :param bid: queue item id
+        :param builds: result of _jenkins_poll(), queue item is requested when job not polled
+        """
+        if builds is not None and job_name in builds.keys():
+            # a build not found is still in queue
+            for b in builds[job_name]:
+                if b.get("queueId") == bid:
+                    return {"number": b["number"], "url": b["url"]}
+            return {}
+
         self._new_server()
 
         # Todo: missing link, if there is a new build, use that build
@@ -416,12 +457,23 @@ class JenkinsServer:
             return {"number": info["executable"]["number"], "url": info["executable"]["url"]}
         return {}
 
-    def _jenkins_job_end(self, job_name: str, number: int) -> (bool, dict):
-        self._new_server()
+    def _jenkins_job_end(self, job_name: str, number: int, builds: dict | None = None) -> (bool, dict):
+        """
+        :param builds: result of _jenkins_poll(), build info is requested when the build not polled
+        """
+        info = None
+        if builds is not None:
+            for b in builds.get(job_name, []):
+                if b.get("number") == number:
+                    info = {"inProgress": b.get("inProgress", b.get("building", True)), "result": b.get("result")}
+                    break
 
-        job_name = "{}/{}".format(JenkinsServer.FOLDER_NAME, job_name)
+        if info is None:
+            self._new_server()
+
+            job_name = "{}/{}".format(JenkinsServer.FOLDER_NAME, job_name)
 
-        info = self.server.get_build_info(job_name, number)
+            info = self.server.get_build_info(job_name, number)
 
         if info["inProgress"]:
             return False, {}
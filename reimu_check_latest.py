@@ -1,9 +1,70 @@
 #!/usr/bin/env python3
 
+import argparse
+from pathlib import Path
+
 from config.loader import reimu_config
-from repo.loader import ruyi_repo
+from repo.shard import Shard, merge_results
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check upstream versions of packages-index board images")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and check each upstream on its own schedule")
+    parser.add_argument("--shard", default="", metavar="i/N",
+                        help="only check shard i of N, results are stored instead of sent as issues")
+    parser.add_argument("--shard-result", default="", metavar="FILE",
+                        help="result file of --shard, default shard-i-of-N.json")
+    parser.add_argument("--output", default="", metavar="FILE",
+                        help="stream one json record per checked board image to FILE, \"-\" for stdout")
+    parser.add_argument("--merge", nargs="+", default=[], metavar="FILE",
+                        help="merge result files of shards and send issues once")
+    parser.add_argument("--draft", default="", metavar="DIR",
+                        help="download new versions of outdated board images and write draft manifests into DIR")
+    args = parser.parse_args()
+
+    shard = None
+    if args.shard:
+        try:
+            shard = Shard.parse(args.shard)
+        except Exception:
+            parser.error("--shard should be i/N with 0 <= i < N")
+        if args.watch:
+            parser.error("--shard cannot be used with --watch")
+    if args.merge and (args.shard or args.watch or args.output):
+        parser.error("--merge cannot be used with --shard, --watch or --output")
+    if args.draft and (args.merge or args.watch):
+        parser.error("--draft cannot be used with --merge or --watch")
+
+    # pygit2/PyGithub/requests are loaded after arguments are parsed
+    from repo.loader import ruyi_repo
+
     reimu_config.load()
-    ruyi_repo.load()
-    ruyi_repo.check()
+    if args.output:
+        from repo.result_sink import result_sink
+        result_sink.open(args.output)
+
+    if args.merge:
+        ruyi_repo.report(merge_results([Path(f) for f in args.merge]))
+    elif shard is not None:
+        from repo.packages_index import packages_index
+
+        ruyi_repo.load()
+        ruyi_repo.check_begin()
+        ruyi_repo.check_urls()
+        results = ruyi_repo.check_upstreams(ruyi_repo.repo_board_images(shard), report=False)
+        ruyi_repo.check_end()
+        shard.store_results(Path(args.shard_result) if args.shard_result else shard.default_result_file(),
+                            results, packages_index.commit)
+    else:
+        ruyi_repo.load()
+        if args.watch:
+            from repo.watcher import repo_watcher
+            repo_watcher.run()
+        else:
+            results = ruyi_repo.check()
+
+    if args.draft:
+        from repo.manifest_draft import manifest_drafter
+
+        ruyi_repo.verify(results, only_new=False)
+        manifest_drafter.draft_all(ruyi_repo.board_image_raw, results, Path(args.draft))
@@ -293,6 +293,7 @@ def reimu_sub(request_path: str):
 
 
 if __name__ == "__main__":
-    reimu_config.load()
+    # only status files are read, no GitHub client
+    reimu_config.load(clients=False)
 
     reimu_server.run(debug=True, host="0.0.0.0", port=4646)
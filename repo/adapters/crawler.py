@@ -0,0 +1,84 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.errors import NetworkException
+from utils.http_session import HttpSession
+from utils.logger import logger
+from .listing_cache import ListingCache
+
+
+class ListingCrawler:
+    """
+    Breadth-first crawler of directory listings, with a worker pool and depth/page budgets.
+    Crawling stops once all wanted filenames are found.
+    """
+
+    SKIP_ENTRIES = {"", "./", "../", "Parent directory/"}
+    # absolute links such as "https://..."
+    SCHEME = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*://")
+
+    def __init__(self, session: HttpSession, extractor, cache: ListingCache,
+                 workers: int = 4, max_depth: int = 4, max_pages: int = 64):
+        """
+        :param extractor: callable, return a new ``ListingExtractor`` for one page
+        :param cache: pages are revalidated by ETag/Last-Modified, new uploads are seen at once
+        """
+        self.session = session
+        self.extractor = extractor
+        self.cache = cache
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+
+        self.pages = 0
+
+    def _list(self, url: str) -> list[str]:
+        """
+        :return: raw entry names of url, directories end with "/"
+        """
+        try:
+            # raw extractor output, the same as cached by MirrorAdapter for its listing urls
+            return self.cache.fetch(self.session, url, lambda resp: self.extractor().feed_response(resp))
+        except NetworkException as e:
+            logger.debug("Skip listing {}: {}".format(url, e))
+            return []
+
+    def crawl(self, root: str, filenames: set[str]) -> set[str]:
+        """
+        :param root: directory url, ends with "/"
+        :param filenames: wanted filenames
+        :return: found filenames
+        """
+        wanted = set(filenames)
+        found = set()
+        level = [root]
+        visited = {root}
+        depth = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reimu-crawl") as executor:
+            while level and wanted:
+                if self.pages + len(level) > self.max_pages:
+                    logger.warn("Crawl {} reached page budget {}".format(root, self.max_pages))
+                    level = level[:self.max_pages - self.pages]
+                    if not level:
+                        break
+                self.pages += len(level)
+
+                next_level = []
+                for url, entries in zip(level, executor.map(self._list, level)):
+                    for vs in entries:
+                        if vs in ListingCrawler.SKIP_ENTRIES or vs.startswith("/") or ListingCrawler.SCHEME.match(vs):
+                            continue
+                        if vs[-1] == "/":
+                            sub = url + vs
+                            if depth < self.max_depth and sub not in visited:
+                                visited.add(sub)
+                                next_level.append(sub)
+                        elif vs in wanted:
+                            wanted.discard(vs)
+                            found.add(vs)
+
+                level = next_level
+                depth += 1
+
+        return found
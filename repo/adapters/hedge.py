@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config.loader import reimu_config
+from utils.auto_loader import auto_load, auto_store
+from utils.logger import logger
+from ..result_sink import check_trace
+
+
+class HostLatency:
+    """
+    Per-host EWMA of listing fetch latency, persisted in cache dir.
+    Hosts with lower latency are tried first on later runs.
+    """
+
+    LATENCY_FILE = "host_latency.json"
+    ALPHA = 0.3
+    # latency recorded for a failed fetch
+    FAIL_PENALTY = 30.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ewma = None
+
+    def _file(self):
+        return reimu_config.cache_dir.joinpath(HostLatency.LATENCY_FILE)
+
+    def _load(self):
+        if self._ewma is not None:
+            return
+        self._ewma = {}
+        fp = self._file()
+        if fp.is_file():
+            try:
+                self._ewma = auto_load(fp)
+            except Exception as e:
+                logger.warn("Broken host latency {}, ignore it: {}".format(fp, e))
+
+    def get(self, host: str) -> float | None:
+        with self._lock:
+            self._load()
+            return self._ewma.get(host)
+
+    def record(self, host: str, latency: float):
+        with self._lock:
+            self._load()
+            old = self._ewma.get(host)
+            self._ewma[host] = latency if old is None else HostLatency.ALPHA * latency + (1 - HostLatency.ALPHA) * old
+
+    def order(self, hosts: list[str]) -> list[int]:
+        """
+        :return: indexes of hosts, lowest latency first, unknown hosts are tried as if they were fastest
+        """
+        with self._lock:
+            self._load()
+            return sorted(range(len(hosts)), key=lambda i: self._ewma.get(hosts[i], 0.0))
+
+    def store(self):
+        with self._lock:
+            if self._ewma is not None:
+                auto_store(self._file(), self._ewma)
+
+
+class HedgedFetch:
+    """
+    Fetch the same listing from several mirrors: the primary is requested first, when it has not
+    answered within ``reimu_config.check_hedge_delay`` seconds (or failed) the next mirror is requested
+    too, the first successful answer is used. Slower requests finish in background and only update latency.
+    """
+
+    def __init__(self, latency: HostLatency):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._executor = None
+
+        self.hedges = 0
+        self.wins = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self.hedges = 0
+            self.wins = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(4, reimu_config.check_workers),
+                                                    thread_name_prefix="reimu-hedge")
+            return self._executor
+
+    def _timed(self, host: str, fetch):
+        start = time.time()
+        try:
+            ans = fetch()
+        except Exception:
+            self.latency.record(host, HostLatency.FAIL_PENALTY)
+            raise
+        self.latency.record(host, time.time() - start)
+        return ans
+
+    def fetch(self, attempts: list[tuple]):
+        """
+        :param attempts: [(host, fetch)], fetch is a callable
+        :return: (index of the answered attempt, result of the first successful fetch)
+        """
+        if len(attempts) == 1 or reimu_config.check_hedge_delay <= 0:
+            host, fetch = attempts[0]
+            return 0, self._timed(host, fetch)
+
+        order = self.latency.order([a[0] for a in attempts])
+        attempts = [attempts[i] for i in order]
+        pool = self._pool()
+        pending = {}
+        started = 0
+        err = None
+
+        def start():
+            nonlocal started
+            host, fetch = attempts[started]
+            # cache hits in hedge threads belong to the check of the caller
+            pending[pool.submit(check_trace.wrap(self._timed), host, fetch)] = started
+            started += 1
+
+        start()
+        while pending:
+            timeout = reimu_config.check_hedge_delay if started < len(attempts) else None
+            done, _ = wait(list(pending.keys()), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.info("{} slower than {}s, hedge with {}".format(
+                    attempts[started - 1][0], reimu_config.check_hedge_delay, attempts[started][0]))
+                with self._lock:
+                    self.hedges += 1
+                start()
+                continue
+
+            for f in done:
+                idx = pending.pop(f)
+                try:
+                    ans = f.result()
+                except Exception as e:
+                    logger.warn("Fetch from {} failed: {}".format(attempts[idx][0], e))
+                    err = e
+                    if started < len(attempts):
+                        start()
+                    continue
+                if idx > 0:
+                    with self._lock:
+                        self.wins += 1
+                return order[idx], ans
+
+        raise err
+
+
+host_latency = HostLatency()
+hedged_fetch = HedgedFetch(host_latency)
@@ -0,0 +1,144 @@
+import hashlib
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+
+from config.loader import reimu_config
+from utils.auto_loader import auto_load, auto_store
+from utils.errors import NetworkException
+from utils.http_session import HttpSession
+from utils.logger import logger
+from ..result_sink import check_trace
+
+
+class ListingCache:
+    """
+    On-disk conditional request cache of mirror directory listings.
+
+    Each url keeps its ETag/Last-Modified and the parsed entry names, a 304 response
+    returns the cached entries without parsing the page again.
+    """
+
+    # entries are raw extractor output, directories end with "/"
+    CACHE_NAME = "mirror_listing_raw"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def _entry_file(self, url: str) -> Path:
+        d = reimu_config.cache_dir.joinpath(ListingCache.CACHE_NAME)
+        if not d.is_dir():
+            d.mkdir(parents=True, exist_ok=True)
+        return d.joinpath(hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, url: str) -> dict:
+        fp = self._entry_file(url)
+        if not fp.is_file():
+            return {}
+        try:
+            entry = auto_load(fp)
+        except Exception as e:
+            logger.warn("Broken listing cache of {}, ignore it: {}".format(url, e))
+            return {}
+        if entry.get("url") != url:
+            return {}
+        return entry
+
+    def fetch(self, session: HttpSession, url: str, parse) -> list[str]:
+        """
+        :param session: http session used to fetch the page
+        :param url: listing page url
+        :param parse: callable, parse streamed response to entry names
+        :return: entry names in this listing
+        """
+        entry = self._load(url)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        resp = session.get(url, headers=headers, stream=True)
+
+        try:
+            if resp.status_code == 304 and entry:
+                with self._lock:
+                    self.hits += 1
+                check_trace.hit("listing")
+                return list(entry["entries"])
+
+            if resp.status_code != 200:
+                raise NetworkException("Get {} get code {}".format(url, str(resp.status_code)))
+
+            entries = parse(resp)
+        finally:
+            resp.close()
+
+        with self._lock:
+            self.misses += 1
+
+        if resp.headers.get("ETag") or resp.headers.get("Last-Modified"):
+            auto_store(self._entry_file(url), {"url": url,
+                                               "etag": resp.headers.get("ETag", ""),
+                                               "last_modified": resp.headers.get("Last-Modified", ""),
+                                               "entries": entries})
+
+        return entries
+
+
+class ListingMemo:
+    """
+    Run-scoped memoization of parsed listings, keyed on (protocol, host, path, version_match).
+    Concurrent lookups of the same key share one fetch.
+    """
+
+    def __init__(self):
+        self.fetches = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def reset(self):
+        with self._lock:
+            self.fetches = 0
+            self.shared = 0
+            self._flights = {}
+
+    def get(self, key: tuple, fetch) -> list[str]:
+        """
+        :param key: (protocol, host, path, version_match)
+        :param fetch: callable, fetch the listing when key not memoized
+        :return: a copy of the memoized listing
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = Future()
+                self._flights[key] = flight
+                self.fetches += 1
+            else:
+                self.shared += 1
+                check_trace.hit("memo")
+
+        if owner:
+            try:
+                flight.set_result(fetch())
+            except Exception as e:
+                # failed fetch will not be memoized, waiting callers get the same exception
+                with self._lock:
+                    self._flights.pop(key, None)
+                flight.set_exception(e)
+
+        return list(flight.result())
+
+
+listing_cache = ListingCache()
+listing_memo = ListingMemo()
@@ -0,0 +1,99 @@
+import codecs
+from html.parser import HTMLParser
+
+
+class ListingExtractor(HTMLParser):
+    """
+    Streaming anchor extractor of directory listing pages.
+
+    Page is fed in chunks, only anchor texts are kept, no DOM is built.
+    Rules for each listing style:
+      + ``container=None``: text of every anchor
+      + ``container="tr"``: text of the first anchor in each row
+      + ``container="tr", first_cell=True``: text of the first anchor in the first cell of each row
+    """
+
+    VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+                     "source", "track", "wbr"}
+    CHUNK_SIZE = 16384
+
+    def __init__(self, container: str = None, first_cell: bool = False, strip: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.container = container
+        self.first_cell = first_cell
+        self.strip = strip
+
+        self.entries = []
+
+        self._in_container = container is None
+        self._taken = False
+        # element depth inside container, and count of container children
+        self._depth = 0
+        self._cells = 0
+        self._anchor = None
+
+    def _accept_anchor(self) -> bool:
+        if self.container is None:
+            return True
+        if not self._in_container or self._taken:
+            return False
+        if self.first_cell:
+            return self._cells == 1
+        return True
+
+    def handle_starttag(self, tag, attrs):
+        if self.container is not None:
+            if tag == self.container:
+                self._in_container = True
+                self._taken = False
+                self._depth = 0
+                self._cells = 0
+                return
+            if not self._in_container:
+                return
+            if self._depth == 0:
+                self._cells += 1
+            if tag not in ListingExtractor.VOID_ELEMENTS:
+                self._depth += 1
+
+        if tag == "a" and self._anchor is None and self._accept_anchor():
+            self._anchor = []
+
+    def handle_startendtag(self, tag, attrs):
+        if self.container is not None and self._in_container and tag != self.container and self._depth == 0:
+            self._cells += 1
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._anchor is not None:
+            text = "".join(self._anchor)
+            self.entries.append(text.strip() if self.strip else text)
+            self._anchor = None
+            self._taken = True
+
+        if self.container is not None and self._in_container:
+            if tag == self.container:
+                self._in_container = False
+            elif tag not in ListingExtractor.VOID_ELEMENTS and self._depth > 0:
+                self._depth -= 1
+
+    def handle_data(self, data):
+        if self._anchor is not None:
+            self._anchor.append(data)
+
+    def feed_response(self, resp) -> list[str]:
+        """
+        Consume a streamed ``requests.Response`` chunk by chunk
+        :return: anchor texts
+        """
+        decoder = codecs.getincrementaldecoder(resp.encoding or "utf-8")(errors="replace")
+        for chunk in resp.iter_content(chunk_size=ListingExtractor.CHUNK_SIZE):
+            self.feed(decoder.decode(chunk))
+        self.feed(decoder.decode(b"", final=True))
+        self.close()
+        return self.entries
+
+    def feed_text(self, text: str) -> list[str]:
+        for i in range(0, len(text), ListingExtractor.CHUNK_SIZE):
+            self.feed(text[i:i + ListingExtractor.CHUNK_SIZE])
+        self.close()
+        return self.entries
@@ -1,15 +1,15 @@
 
 import re
-import requests
-from bs4 import BeautifulSoup
-from pathlib import Path
 
-from utils.errors import NetworkException
+from utils.http_session import HttpSession, http_session
+from .crawler import ListingCrawler
+from .listing_cache import listing_cache, listing_memo
+from .listing_parser import ListingExtractor
 
 
 class MirrorAdapter:
 
-    def __new__(cls, *args):
+    def __new__(cls, *args, **kwargs):
 
         host = args[1]
         if host == "mirror.iscas.ac.cn":
@@ -25,22 +25,50 @@ class MirrorAdapter:
 
         return object.__new__(cls)
 
-    def __init__(self, protocol: str, host: str, path: str):
+    def __init__(self, protocol: str, host: str, path: str, session: HttpSession = None):
         """
 
         :param protocol: http/https
         :param host: hostname
         :param path: Absolute path
+        :param session: shared http session, default ``http_session``
         """
         self.protocol = protocol
         self.host = host
         self.path = path
+        self.session = session if session is not None else http_session
 
     def get_url(self) -> str:
         return "{}://{}{}/".format(self.protocol, self.host, self.path)
 
+    def _listing_extractor(self) -> ListingExtractor:
+        """
+        Anchor extract rule of this mirror's listing page
+        """
+        return ListingExtractor()
+
+    def _parse_entries(self, resp) -> list[str]:
+        """
+        Parse streamed listing page to raw entry names, directories end with "/".
+        Listing cache keeps raw entries, the same page crawled by ``ListingCrawler`` shares them.
+        """
+        return self._listing_extractor().feed_response(resp)
+
+    @staticmethod
+    def _strip_entries(entries: list[str]) -> list[str]:
+        """
+        :return: non-empty entry names, trailing "/" of directories removed
+        """
+        return [vs[:-1] if vs[-1] == '/' else vs for vs in entries if vs]
+
+    def _fetch_releases(self, version_match: str) -> list[str]:
+        entries = MirrorAdapter._strip_entries(
+            listing_cache.fetch(self.session, self.get_url(), self._parse_entries))
+        return [vs for vs in entries if not version_match or re.match(version_match, vs)]
+
     def get_releases(self, version_match: str) -> list[str]:
-        return []
+        return listing_memo.get((self.protocol, self.host, self.path, version_match),
+                                lambda: self._fetch_releases(version_match))
 
     def find_assets(self, release: str, filenames: list[str]) -> bool:
         return False
@@ -48,65 +76,11 @@ class MirrorAdapter:
 
 class IscasMirrorAdapter(MirrorAdapter):
 
-    def __init__(self, protocol: str, host: str, path: str):
-        super().__init__(protocol, host, path)
+    def __init__(self, protocol: str, host: str, path: str, session: HttpSession = None):
+        super().__init__(protocol, host, path, session)
 
-    def get_releases(self, version_match: str) -> list[str]:
-        url = self.get_url()
-        resp = requests.get(url)
-
-        if resp.status_code != 200:
-            raise NetworkException("Get {} get code {}".format(url, str(resp.status_code)))
-
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        vss = []
-        for tr in soup.find_all("tr"):
-            vs = tr.contents[0].a
-            if vs is None:
-                continue
-            vs = vs.text
-            if len(vs) == 0:
-                continue
-            if vs[-1] == '/':
-                vs = vs[:-1]
-            if re.match(version_match, vs):
-                vss.append(vs)
-
-        return vss
-
-    def _find_assets_in(self, url: str, filenames: list[str]) -> bool:
-        resp = requests.get(url)
-
-        if resp.status_code != 200:
-            return False
-
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        flag = False
-        for tr in soup.find_all("tr"):
-            if len(filenames) == 0:
-                break
-
-            vs = tr.contents[0].a
-            if vs is None:
-                continue
-            vs = vs.text
-            # 非当前 非上级
-            up = Path(url)
-            if up == up.joinpath(vs) or up.parent == up.joinpath(vs):
-                continue
-            # 目录搜索 文件匹配
-            if vs[-1] == '/':
-                flag = self._find_assets_in(url + vs, filenames) or flag
-            else:
-                for i in range(len(filenames)):
-                    if vs == filenames[i]:
-                        filenames.pop(i)
-                        flag = True
-                        break
-
-        return flag
+    def _listing_extractor(self) -> ListingExtractor:
+        return ListingExtractor("tr", first_cell=True)
 
     def find_assets(self, release: str, filenames: list[str]) -> bool:
         """
@@ -115,121 +89,43 @@ class IscasMirrorAdapter(MirrorAdapter):
         :param filenames:
         :return: Some files were found in this release
         """
-        return self._find_assets_in("https://{}{}/{}/".format(self.host, self.path, release), filenames)
+        crawler = ListingCrawler(self.session, self._listing_extractor, listing_cache)
+        found = crawler.crawl("https://{}{}/{}/".format(self.host, self.path, release), set(filenames))
+        filenames[:] = [f for f in filenames if f not in found]
+        return len(found) > 0
 
 
 class OpenWrtDownloadsMirrorAdapter(MirrorAdapter):
 
-    def __init__(self, protocol: str, host: str, path: str):
-        super().__init__(protocol, host, path)
-
-    def get_releases(self, version_match: str) -> list[str]:
-        url = self.get_url()
-        resp = requests.get(url)
-
-        if resp.status_code != 200:
-            raise NetworkException("Get {} get code {}".format(url, str(resp.status_code)))
-
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        vss = []
-        for tr in soup.find_all("tr"):
-            vs = tr.a
-            if vs is None:
-                continue
-            vs = vs.text
-            if not vs:
-                continue
-            if vs[-1] == '/':
-                vs = vs[:-1]
-            if not version_match or re.match(version_match, vs):
-                vss.append(vs)
+    def __init__(self, protocol: str, host: str, path: str, session: HttpSession = None):
+        super().__init__(protocol, host, path, session)
 
-        return vss
+    def _listing_extractor(self) -> ListingExtractor:
+        return ListingExtractor("tr")
 
 
 class UbuntuCdimageMirrorAdapter(MirrorAdapter):
 
-    def __init__(self, protocol: str, host: str, path: str):
-        super().__init__(protocol, host, path)
+    def __init__(self, protocol: str, host: str, path: str, session: HttpSession = None):
+        super().__init__(protocol, host, path, session)
 
-    def get_releases(self, version_match: str) -> list[str]:
-        url = self.get_url()
-        resp = requests.get(url)
-
-        if resp.status_code != 200:
-            raise NetworkException("Get {} get code {}".format(url, str(resp.status_code)))
-
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        vss = []
-        for tr in soup.find_all("li"):
-            vs = tr.a
-            if vs is None:
-                continue
-            vs = vs.text.strip()
-            if not vs:
-                continue
-            if vs[-1] == '/':
-                vs = vs[:-1]
-            if not version_match or re.match(version_match, vs):
-                vss.append(vs)
-
-        return vss
+    def _listing_extractor(self) -> ListingExtractor:
+        return ListingExtractor("li", strip=True)
 
 
 class FreebsdDownloadMirrorAdapter(MirrorAdapter):
 
-    def __init__(self, protocol: str, host: str, path: str):
-        super().__init__(protocol, host, path)
-
-    def get_releases(self, version_match: str) -> list[str]:
-        url = self.get_url()
-        resp = requests.get(url)
-
-        if resp.status_code != 200:
-            raise NetworkException("Get {} get code {}".format(url, str(resp.status_code)))
+    def __init__(self, protocol: str, host: str, path: str, session: HttpSession = None):
+        super().__init__(protocol, host, path, session)
 
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        vss = []
-        for tr in soup.find_all("tr"):
-            vs = tr.a
-            if vs is None:
-                continue
-            vs = vs.text
-            if not vs:
-                continue
-            if vs[-1] == '/':
-                vs = vs[:-1]
-            if not version_match or re.match(version_match, vs):
-                vss.append(vs)
-
-        return vss
+    def _listing_extractor(self) -> ListingExtractor:
+        return ListingExtractor("tr")
 
 
 class OpenkylinReleasesMirrorAdapter(MirrorAdapter):
 
-    def __init__(self, protocol: str, host: str, path: str):
-        super().__init__(protocol, host, path)
-
-    def get_releases(self, version_match: str) -> list[str]:
-        url = self.get_url()
-        resp = requests.get(url)
-
-        if resp.status_code != 200:
-            raise NetworkException("Get {} get code {}".format(url, str(resp.status_code)))
-
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        vss = []
-        for a in soup.find_all("a"):
-            vs = a.text
-            if vs is None:
-                continue
-            if vs[-1] == '/':
-                vs = vs[:-1]
-            if not version_match or re.match(version_match, vs):
-                vss.append(vs)
+    def __init__(self, protocol: str, host: str, path: str, session: HttpSession = None):
+        super().__init__(protocol, host, path, session)
 
-        return vss
+    def _listing_extractor(self) -> ListingExtractor:
+        return ListingExtractor()
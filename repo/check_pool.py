@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config.loader import reimu_config
+from utils.logger import logger
+from .result_sink import check_trace, result_sink
+
+
+class HostLimiter:
+    """
+    Per-host concurrency limit, configured by ``max_connections`` in mirrors.toml
+    """
+
+    def __init__(self, default_limit: int):
+        self.default_limit = default_limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @staticmethod
+    def host_limit(host: str, default_limit: int) -> int:
+        mirror = reimu_config.ruyi_repo_mirrors.get(host, {})
+        if isinstance(mirror, list):
+            limits = [int(m["max_connections"]) for m in mirror if "max_connections" in m.keys()]
+            limit = min(limits) if limits else default_limit
+        else:
+            limit = int(mirror.get("max_connections", default_limit))
+        return max(1, limit)
+
+    def semaphore(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._semaphores.keys():
+                self._semaphores[host] = threading.Semaphore(HostLimiter.host_limit(host, self.default_limit))
+            return self._semaphores[host]
+
+    def acquire(self, hosts: list[str]):
+        # always acquire in sorted order, images across several hosts will not deadlock
+        for h in sorted(hosts):
+            self.semaphore(h).acquire()
+
+    def release(self, hosts: list[str]):
+        for h in sorted(hosts, reverse=True):
+            self.semaphore(h).release()
+
+
+class CheckPool:
+    """
+    Check board images concurrently, results are returned in the order of input
+    """
+
+    def __init__(self, workers: int = 0, host_workers: int = 0):
+        self.workers = workers if workers > 0 else reimu_config.check_workers
+        self.limiter = HostLimiter(host_workers if host_workers > 0 else reimu_config.check_host_workers)
+
+    def _check_one(self, board_image) -> (dict, Exception):
+        hosts = board_image.hosts
+        self.limiter.acquire(hosts)
+        check_trace.begin()
+        start = time.time()
+        info, err = {}, None
+        try:
+            info = board_image.check()
+        except Exception as e:
+            err = e
+        finally:
+            self.limiter.release(hosts)
+            cost = time.time() - start
+            logger.debug("Check board image {} cost {:.3f}s".format(board_image.title, cost))
+        # streamed as soon as this check completes
+        result_sink.write(board_image, info, err, cost, check_trace.end())
+        return info, err
+
+    def run(self, board_images: list) -> list[tuple]:
+        """
+        :param board_images: list[RepoBoardImage]
+        :return: [(board_image, info, exception)], exception is None when check succeeded
+        """
+        if not board_images:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(board_images)),
+                                thread_name_prefix="reimu-check") as executor:
+            futures = [executor.submit(self._check_one, bi) for bi in board_images]
+            results = []
+            for bi, f in zip(board_images, futures):
+                info, err = f.result()
+                results.append((bi, info, err))
+
+        return results
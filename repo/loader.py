@@ -1,17 +1,24 @@
 
-import pygit2
-import re
-import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from semver import VersionInfo
 
 from config.loader import reimu_config
-from utils.auto_loader import auto_load
 from utils.github_operation import gh_op
+from utils.http_session import http_session
 from utils.logger import logger
 # from utils.error import ParseException
 # from utils.logger import logger
+from .adapters.hedge import hedged_fetch, host_latency
+from .adapters.listing_cache import listing_cache, listing_memo
 from .adapters.mirror_adapter import MirrorAdapter
+from .check_pool import CheckPool
+from .mirror_rules import ImageUrl, mirror_rules
+from .packages_index import packages_index
+from .result_sink import check_trace
+from .shard import Shard
+from .snapshot import snapshot_store
+from .verifier import release_verifier
 
 
 class RepoBoardImage:
@@ -52,8 +59,7 @@ class RepoBoardImage:
         elif image_type in ["MIRROR_SINGLE", "MIRROR_MULTI"]:
             cls = RepoMirrorImage
         else:
-            # todo: MISC image
-            pass
+            cls = RepoMiscImage
 
         return object.__new__(cls)
 
@@ -64,6 +70,9 @@ class RepoBoardImage:
         self.title = title
         self.image_type = board_image["image_type"]
         self.files = board_image["files"]
+        self.hosts = sorted({f.host for f in self.files})
+        # upstream identity, board images with the same key share one upstream
+        self.snapshot_key = title
 
     def check(self) -> dict:
         """
@@ -87,6 +96,7 @@ class RepoGithubImage(RepoBoardImage):
         github_repo = self.files[0]
         self.upstream_repo = github_repo.repo_name[0] + "/" + github_repo.repo_name[1]
         self.version_match = github_repo.version_match
+        self.snapshot_key = "https://github.com/" + self.upstream_repo
 
     def check(self) -> dict:
         logger.info("Check board image {} on github repo {}".format(self.title, self.upstream_repo))
@@ -97,23 +107,28 @@ class RepoGithubImage(RepoBoardImage):
             else:
                 version_list[f.version_name] = [f.filename]
 
-        upstream_releases = gh_op.get_repo_releases(self.upstream_repo)
+        def fetch():
+            # a truncated prefetch is not snapshotted, it may miss tags of other board images on this repo
+            releases, complete = gh_op.get_repo_releases_complete(self.upstream_repo, version_list.keys())
+            return [u.tag_name for u in releases], complete
+
+        upstream_releases = snapshot_store.releases(self.snapshot_key, fetch)
         latest_version = ""
         ruyi_version = ""
 
-        for u in upstream_releases:
+        for tag_name in upstream_releases:
             # get latest version
             # versions are sort in time,
             # but we cannot sort these version code
             # they could in invalid version format
             # todo: 版本排序
             if latest_version == "":
-                latest_version = u.tag_name  # 使用 tag 进行版本比较
+                latest_version = tag_name  # 使用 tag 进行版本比较
 
             # check assets
             # todo: 更好的版本匹配
             for v in version_list.keys():
-                if v == u.tag_name:  # 直接使用字符串进行版本比较
+                if v == tag_name:  # 直接使用字符串进行版本比较
                     ruyi_version = v
                     break
 
@@ -135,6 +150,20 @@ class RepoMirrorImage(RepoBoardImage):
         self.upstream_repo = mirror.repo_name
         self.version_match = mirror.version_match
 
+        self.adapter = RepoMirrorImage._adapter(mirror)
+        self.snapshot_key = "{}#{}".format(self.adapter.get_url(), self.version_match)
+        # same releases on other mirrors, raced by hedged_fetch: [(adapter, version_match)]
+        # only mirrors naming the release directory the same way, their releases are compared with ours
+        self.mirrors = [(self.adapter, self.version_match)]
+        for alt in mirror.alternates:
+            if alt.host != "github.com" and alt.host not in [m[0].host for m in self.mirrors] and \
+                    alt.version_name == mirror.version_name:
+                self.mirrors.append((RepoMirrorImage._adapter(alt), alt.version_match))
+        # raced mirrors take host slots of CheckPool too
+        self.hosts = sorted(set(self.hosts) | {a.host for a, _ in self.mirrors})
+
+    @staticmethod
+    def _adapter(mirror: ImageUrl) -> MirrorAdapter:
         mirror_path = ""
         idx = int(mirror.version)
         if idx < 0:
@@ -142,7 +171,14 @@ class RepoMirrorImage(RepoBoardImage):
         for i in range(1, idx):
             mirror_path += "/" + mirror.parts[i]
 
-        self.adapter = MirrorAdapter(mirror.protocol, mirror.host, mirror_path)
+        return MirrorAdapter(mirror.protocol, mirror.host, mirror_path)
+
+    def _fetch_releases(self) -> tuple[MirrorAdapter, list[str]]:
+        """
+        :return: (adapter of the mirror answered, releases)
+        """
+        idx, releases = hedged_fetch.fetch([(a.host, lambda a=a, m=m: a.get_releases(m)) for a, m in self.mirrors])
+        return self.mirrors[idx][0], releases
 
     def check(self) -> (bool, str, str):
         logger.info("Check board image {}".format(self.title))
@@ -154,9 +190,17 @@ class RepoMirrorImage(RepoBoardImage):
             else:
                 version_list[f.version_name] = [f.filename]
 
+        # links point to the mirror answered, the primary one when releases come from snapshot
+        adapter = self.adapter
+
+        def fetch():
+            nonlocal adapter
+            adapter, releases = self._fetch_releases()
+            return releases
+
         # todo: release 排序
-        releases = self.adapter.get_releases(self.version_match)
-        releases.sort(reverse=True)
+        releases = snapshot_store.releases(self.snapshot_key, fetch)
+        releases = sorted(releases, reverse=True)
 
         ruyi_latest = ""
         for r in releases:
@@ -169,88 +213,45 @@ class RepoMirrorImage(RepoBoardImage):
 
         return {"update": ruyi_latest == releases[0],
                 "latest_version": releases[0],
-                "latest_url": self.adapter.get_url() + "/" + releases[0],
+                "latest_url": adapter.get_url() + "/" + releases[0],
                 "current_version": ruyi_latest,
-                "upstream_repo": self.adapter.get_url()}
-
+                "upstream_repo": adapter.get_url()}
 
-class ImageUrl:
-    def __init__(self, url: str):
-        self.url = url
-        self.valid = False
-
-        url_path = Path(url)
-
-        # get host
-        if len(url_path.parts) < 3:
-            return
-        self.host = url_path.parts[1]
 
-        if self.host not in reimu_config.ruyi_repo_mirrors.keys():
-            return
+class RepoMiscImage(RepoBoardImage):
+    """
+    Board image with files across hosts or repos, each (host, repo) group is checked
+    as a GitHub/mirror image of its own, concurrently
+    """
 
-        # get parts
-        self.protocol = url_path.parts[0][:-1]
-        self.parts = []
-        for i in range(1, len(url_path.parts)):
-            self.parts.append(url_path.parts[i])
-
-        # get repo_name
-        if isinstance(reimu_config.ruyi_repo_mirrors[self.host], list):
-            # check repo name
-            fnd = False
-            for repo in reimu_config.ruyi_repo_mirrors[self.host]:
-                if repo["repo_name"] == self.parts[int(repo["repo"])]:
-                    # check version
-                    self.version = repo["version"]
-                    self.version_name = self.index(self.version)[0]
-                    self.version_match = repo.get("version_match", "")
-                    if not re.match(self.version_match, self.version_name):
-                        continue
-                    # get repo name
-                    self.repo_name = repo["repo_name"]
-                    fnd = True
-                    break
-            if not fnd:
-                return
+    def __init__(self, title: str, board_image: dict):
+        super().__init__(title, board_image)
+        groups = {}
+        for f in self.files:
+            repo = "/".join(f.repo_name) if isinstance(f.repo_name, list) else str(f.repo_name)
+            groups.setdefault((f.host, repo), []).append(f)
+        self.groups = [RepoBoardImage("{} ({}/{})".format(title, host, repo), {"files": files})
+                       for (host, repo), files in sorted(groups.items())]
+        self.hosts = sorted({h for g in self.groups for h in g.hosts})
 
-        else:
-            self.repo_name = self.index(reimu_config.ruyi_repo_mirrors[self.host]["repo"])
-            if not self.repo_name:
-                return
-
-            # check version
-            self.version = reimu_config.ruyi_repo_mirrors[self.host]["version"]
-            self.version_name = self.index(self.version)[0]
-            self.version_match = reimu_config.ruyi_repo_mirrors[self.host].get("version_match", "")
-            if not re.match(self.version_match, self.version_name):
-                return
-
-        # get filename
-        self.filename = self.parts[-1]
-
-        # set valid
-        self.valid = True
-
-    def index(self, index: str) -> list[str]:
-        if ".." in index:
-            frm, to = index.split("..")
-            frm, to = int(frm), int(to)
-            if frm < 0:
-                frm = len(self.parts) + frm
-            if to < 0:
-                to = len(self.parts) + to
-
-            ans = []
-            if frm < 0 or to < 0:
-                return ans
-
-            for i in range(frm, to+1):
-                ans.append(self.parts[i])
-            return ans
+    def check(self) -> dict:
+        """
+        :return: merged info of groups, "update" is True only when all groups are the latest,
+                 infos of groups are in "groups" in the order of ``self.groups``
+        """
+        logger.info("Check board image {} in {} groups".format(self.title, len(self.groups)))
+        with ThreadPoolExecutor(max_workers=len(self.groups), thread_name_prefix="reimu-misc") as executor:
+            # cache hits of groups belong to the check of this board image
+            infos = list(executor.map(check_trace.wrap(lambda g: g.check()), self.groups))
 
-        else:
-            return [self.parts[int(index)]]
+        outdated = [i for i in infos if not i["update"]]
+        first = outdated[0] if outdated else infos[0]
+        return {"update": not outdated,
+                "latest_version": "; ".join(i["latest_version"] for i in infos),
+                "latest_url": first["latest_url"],
+                "current_version": "; ".join(i["current_version"] for i in infos),
+                "upstream_repo": "; ".join(i["upstream_repo"] for i in infos),
+                "groups": infos}
 
 
 class Repo:
@@ -259,6 +260,8 @@ class Repo:
         self.board_image = {}
         self.board_image_raw = []
         self.repo_cache = Path()
+        # {board_image: seconds}
+        self.load_time = {}
 
     def ready(self) -> bool:
         return self._ready
@@ -267,36 +270,70 @@ class Repo:
         if not reimu_config.ready():
             raise Exception("ruyi-reimu not configured")
 
-        # clone repo
-        self.repo_cache = reimu_config.tmpdir.joinpath("ruyi_repo")
-        if self.repo_cache.exists():
-            shutil.rmtree(self.repo_cache)
-        pygit2.clone_repository(reimu_config.ruyi_repo, self.repo_cache,
-                                checkout_branch=reimu_config.ruyi_repo_branch, depth=1)
+        self.board_image_raw = []
+
+        # sync repo
+        packages_index.sync()
+        self.repo_cache = packages_index.path
+        changed = packages_index.changed_board_images()
+        if changed is not None:
+            logger.info("{} board images changed since last load".format(len(changed)))
 
         # load latest config of each board image
-        board_images = self.repo_cache.joinpath("manifests", "board-image")
-        for i in board_images.iterdir():
-            cfg = {}
-            cfgf = ""
-            cfgv = VersionInfo(0, 0, 0)
-            for c in i.iterdir():
-                # try:
-                    cfgnv = VersionInfo.parse(c.stem)
-                    if cfgnv > cfgv:
-                        cfgv = cfgnv
-                        cfgf = c.name
-                        cfg = auto_load(c)
-                # except ParseException as e:
-                #    logger.error(e.message)
-            self.board_image_raw.append({i.name: cfg, "file_name": cfgf, "board_image": i.name})
+        manifests = {}
+        self.load_time = {}
+        for board, cfgf in sorted(packages_index.manifest_index().items()):
+            start = time.time()
+            cached = packages_index.manifests.get(board)
+            if changed is not None and board not in changed and cached and cached["file_name"] == cfgf:
+                cfg = cached["manifest"]
+            else:
+                try:
+                    cfg = packages_index.load_manifest(board, cfgf)
+                except Exception as e:
+                    logger.error("Load manifest {}/{} failed: {}".format(board, cfgf, e))
+                    continue
+            manifests[board] = {"file_name": cfgf, "manifest": cfg}
+            self.board_image_raw.append({board: cfg, "file_name": cfgf, "board_image": board})
+            self.load_time[board] = time.time() - start
+            logger.debug("Load board image {} from {} cost {:.3f}s".format(board, cfgf, self.load_time[board]))
+
+        packages_index.manifests = manifests
+        packages_index.store_state()
+        if packages_index.bare:
+            logger.info("Manifest blob cache: {} hits, {} misses"
+                        .format(packages_index.blob_hits, packages_index.blob_misses))
+        slowest = sorted(self.load_time.items(), key=lambda t: t[1], reverse=True)[:5]
+        logger.info("Load {} board images cost {:.3f}s, slowest: {}"
+                    .format(len(self.load_time), sum(self.load_time.values()),
+                            ", ".join("{} {:.3f}s".format(b, t) for b, t in slowest)))
 
         self._ready = True
         logger.info("Ruyi repository load done\n\n")
 
-    def check(self):
-
+    def check(self) -> list[tuple]:
+        """
+        :return: [(board_image, info, exception)]
+        """
+        self.check_begin()
+        self.check_urls()
+        results = self.check_upstreams(self.repo_board_images())
+        self.check_end()
+        return results
+
+    def check_begin(self):
+        listing_cache.reset_stats()
+        listing_memo.reset()
+        http_session.reset_stats()
+        snapshot_store.reset_stats()
+        gh_op.scheduler.reset_stats()
+        release_verifier.reset_stats()
+        hedged_fetch.reset_stats()
+        mirror_rules.load(reimu_config.ruyi_repo_mirrors)
+
+    def check_urls(self):
         # get all supported urls
+        self.board_image = {}
         for bi in self.board_image_raw:
             logger.info("Check board image {} urls".format(bi["board_image"]))
             distfiles = bi[bi["board_image"]]["distfiles"]
@@ -305,14 +342,15 @@ class Repo:
                 for distfile in distfiles:
                     urls = []
                     for url in distfile["urls"]:
-                        u = ImageUrl(url)
+                        u = mirror_rules.classify(url)
                         if not u.valid:
                             continue
                         urls.append(u)
                     if urls:
                         files.append(urls[0])
+                        urls[0].alternates = urls[1:]
                         if len(urls) > 1:
-                            logger.warn("{} urls of file {} are supported, use the first one"
+                            logger.info("{} urls of file {} are supported, race them when checking"
                                         .format(len(urls), distfile["name"]))
                     else:
                         logger.warn("No url of file {} is supported, skip this file".format(distfile["name"]))
@@ -328,32 +366,105 @@ class Repo:
 
         logger.info("Check board image urls done\n\n")
 
-        # get board image
-        for bi in self.board_image.items():
-            repo_board_image = RepoBoardImage(bi[0], bi[1])
-            try:
-                info = repo_board_image.check()
-            except Exception as e:
-                print(e)
+    def repo_board_images(self, shard: Shard = None) -> list[RepoBoardImage]:
+        """
+        :param shard: only board images of this shard
+        """
+        return [RepoBoardImage(bi[0], bi[1]) for bi in sorted(self.board_image.items())
+                if shard is None or shard.owns(bi[0])]
+
+    def check_upstreams(self, board_images: list[RepoBoardImage], report: bool = True) -> list[tuple]:
+        """
+        Check board images concurrently
+        :param report: send issues of results, shards leave this to the merge step
+        :return: [(board_image, info, exception)]
+        """
+        images = []
+        for bi in board_images:
+            images += bi.groups if isinstance(bi, RepoMiscImage) else [bi]
+        gh_op.prefetch_releases([bi.upstream_repo for bi in images
+                                 if isinstance(bi, RepoGithubImage) and not snapshot_store.is_fresh(bi.snapshot_key)])
+        results = CheckPool().run(board_images)
+        if reimu_config.check_verify:
+            Repo.verify(results)
+        if report:
+            Repo.report([(bi.title, info, err) for bi, info, err in results])
+
+        return results
+
+    @staticmethod
+    def verify(results: list[tuple], only_new: bool = True):
+        """
+        Verify files of new versions which will be reported, MISC images are verified by outdated groups
+        :param only_new: skip versions already reported
+        """
+        checks = []
+        miscs = []
+        for bi, info, err in results:
+            if err is not None or "latest_version" not in info.keys() or info["update"] or "files" in info.keys():
+                continue
+            if only_new and snapshot_store.reported_version(bi.title) == info["latest_version"]:
+                continue
+            if isinstance(bi, RepoMiscImage):
+                checks += [(g, i) for g, i in zip(bi.groups, info["groups"]) if not i["update"]]
+                miscs.append(info)
             else:
-                Repo.send_issue(repo_board_image, info)
+                checks.append((bi, info))
+
+        release_verifier.verify(checks)
+        for info in miscs:
+            info["files"] = [f for i in info["groups"] for f in i.get("files", [])]
 
+    @staticmethod
+    def report(results: list[tuple]):
+        """
+        Issues are queued in title order and sent after all results
+        :param results: [(board_image title, info, exception)]
+        """
+        for title, info, err in results:
+            if err is not None:
+                logger.error("Check board image {} failed: {}".format(title, err))
+                continue
+            if not info["update"] and snapshot_store.reported_version(title) == info["latest_version"]:
+                logger.info("Board image {} latest version {} already reported".format(title, info["latest_version"]))
+                continue
+            if info["update"]:
+                logger.info("Board image {} already the latest".format(title))
+                continue
+            Repo.send_issue(title, info,
+                            on_done=lambda t=title, v=info["latest_version"]: snapshot_store.set_reported(t, v))
+        gh_op.flush_issues()
+
+    def check_end(self):
+        logger.info("Mirror listing cache: {} hits, {} misses".format(listing_cache.hits, listing_cache.misses))
+        logger.info("Mirror listing memo: {} fetches, {} shared".format(listing_memo.fetches, listing_memo.shared))
+        listing_memo.reset()
+        gh_op.clear_releases()
+        gh_op.clear_issue_sync()
+        logger.info("Upstream snapshots: {} fresh within ttl".format(snapshot_store.fresh_hits))
+        logger.info("Release verification: {} probes".format(release_verifier.probes))
+        logger.info("Hedged mirror fetches: {} hedged, {} won by other mirrors"
+                    .format(hedged_fetch.hedges, hedged_fetch.wins))
+        host_latency.store()
+        http_session.log_stats()
+        gh_op.scheduler.log_stats()
         logger.info("Check board image upstreams done")
 
     @staticmethod
-    def send_issue(board_image: RepoBoardImage, info: dict):
+    def send_issue(board_image: str, info: dict, on_done=None):
         """
-        Send issue
-        :param board_image:
+        Queue issue, sent by ``gh_op.flush_issues``
+        :param board_image: board image title
         :param info:
+        :param on_done: callable, called after the issue was sent
         :return:
         """
 
         if info["update"]:
-            logger.info("Board image {} already the latest".format(board_image.title))
+            logger.info("Board image {} already the latest".format(board_image))
             return
 
-        title = "[ruyi-reimu] Board image {} need update".format(board_image.title)
+        title = "[ruyi-reimu] Board image {} need update".format(board_image)
         body = "## Description\n"
 
 
@@ -362,20 +473,30 @@ class Repo:
         body += ("\n+ In upstream repo <{}>, the latest version is [{}]({})"
                  .format(info["upstream_repo"], info["latest_version"], info["latest_url"]))
         body += ("\n+ The current version in ruyi upstream is {}".format(info["current_version"]))
+        for i in info.get("groups", []):
+            body += ("\n   + <{}>: {} [{}]({}), current {}"
+                     .format(i["upstream_repo"], "latest" if i["update"] else "new version",
+                             i["latest_version"], i["latest_url"], i["current_version"]))
 
         packidx = ("{}/tree/{}/manifests/board-image/{}"
-                   .format(reimu_config.ruyi_repo, reimu_config.ruyi_repo_branch, board_image.title))
+                   .format(reimu_config.ruyi_repo, reimu_config.ruyi_repo_branch, board_image))
         body += ("\n+ The packages-index info is [{}]({})".format(packidx, packidx))
 
-        # if len(missing_files):
-        #    logger.warn("In board image {}, following files not found in upstream releases {}"
-        #                .format(self.title, str(missing_files)))
-        #    body += ("\n+ In upstream repo [{}]({}), these images are missing"
-        #             .format(upstream_title, upstream_url))
-        #    for n in missing_files:
-        #        body += "\n   +{}".format(n)
+        if "files" in info.keys():
+            missing = [f["name"] for f in info["files"] if not f["found"]]
+            body += ("\n+ Files in the latest version, {} found, {} missing"
+                     .format(len(info["files"]) - len(missing), len(missing)))
+            for f in info["files"]:
+                if f["found"]:
+                    size = "{:.1f} MiB".format(f["size"] / 1048576) if f["size"] >= 0 else "unknown size"
+                    found = f["url"].rsplit("/", 1)[1]
+                    body += "\n   + [x] [{}]({}) {}".format(found, f["url"], size)
+                    if found != f["name"]:
+                        body += ", replaces {}".format(f["name"])
+                else:
+                    body += "\n   + [ ] {} not found, need manual check".format(f["name"])
 
-        gh_op.create_issue(reimu_config.issue_to, title, body)
+        gh_op.queue_issue(reimu_config.issue_to, title, body, on_done)
 
 
 ruyi_repo = Repo()
@@ -0,0 +1,224 @@
+import copy
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from semver import VersionInfo
+
+from config.loader import reimu_config
+from utils.auto_loader import auto_dumps
+from utils.errors import NetworkException
+from utils.http_session import HttpSession, http_session
+from utils.logger import logger
+from .mirror_rules import ImageUrl, mirror_rules
+from .packages_index import PackagesIndex
+from .verifier import ReleaseVerifier
+
+
+class ManifestDrafter:
+    """
+    Draft manifests of new upstream versions for packages-index.
+
+    Files of the new version found by the release verifier are downloaded with parallel range requests,
+    chunks are hashed in order as they arrive, so at most a window of chunks is held in memory
+    and nothing is written to disk.
+    """
+
+    DEFAULT_CHECKSUMS = ["sha256", "sha512"]
+
+    def __init__(self, session: HttpSession = None):
+        self.session = session if session is not None else http_session
+        self._lock = threading.Lock()
+        self.downloaded = 0
+        self.ranges = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self.downloaded = 0
+            self.ranges = 0
+
+    def _head(self, url: str) -> tuple[str, int, bool]:
+        """
+        :return: (url after redirects, size, whether byte ranges are accepted), size is -1 if unknown
+        """
+        resp = self.session.head(url, allow_redirects=True)
+        if resp.status_code in (405, 501):
+            resp = self.session.get(url, allow_redirects=True, stream=True)
+            resp.close()
+        if resp.status_code != 200:
+            raise NetworkException("Get {} failed with status {}".format(url, resp.status_code))
+        size = resp.headers.get("Content-Length", "")
+        return resp.url, int(size) if size.isdigit() else -1, resp.headers.get("Accept-Ranges", "") == "bytes"
+
+    def _range(self, url: str, start: int, end: int) -> bytes:
+        resp = self.session.get(url, headers={"Range": "bytes={}-{}".format(start, end)})
+        if resp.status_code != 206 or len(resp.content) != end - start + 1:
+            raise NetworkException("Get range {}-{} of {} failed with status {}, {} bytes"
+                                   .format(start, end, url, resp.status_code, len(resp.content)))
+        with self._lock:
+            self.ranges += 1
+        return resp.content
+
+    def _update(self, hashes: list, data: bytes) -> int:
+        for h in hashes:
+            h.update(data)
+        with self._lock:
+            self.downloaded += len(data)
+        return len(data)
+
+    def fetch(self, url: str, algorithms: list[str]) -> dict:
+        """
+        Download and hash a file without storing it
+        :return: {"size": int, "checksums": {algorithm: hex digest}}
+        """
+        hashes = [hashlib.new(a) for a in algorithms]
+        real_url, size, ranges = self._head(url)
+        chunk = reimu_config.check_draft_chunk_size
+        total = 0
+
+        if ranges and size > chunk:
+            logger.info("Download {} in {} ranges".format(url, (size + chunk - 1) // chunk))
+            # chunks are hashed in order, later ones wait in the window
+            window = 2 * reimu_config.check_draft_workers
+            pending = deque()
+            with ThreadPoolExecutor(max_workers=reimu_config.check_draft_workers,
+                                    thread_name_prefix="reimu-draft") as executor:
+                try:
+                    for start in range(0, size, chunk):
+                        pending.append(executor.submit(self._range, real_url, start, min(start + chunk, size) - 1))
+                        if len(pending) >= window:
+                            total += self._update(hashes, pending.popleft().result())
+                    while pending:
+                        total += self._update(hashes, pending.popleft().result())
+                except Exception:
+                    for f in pending:
+                        f.cancel()
+                    raise
+        else:
+            logger.info("Download {}".format(url))
+            resp = self.session.get(real_url, stream=True)
+            try:
+                if resp.status_code != 200:
+                    raise NetworkException("Get {} failed with status {}".format(url, resp.status_code))
+                for data in resp.iter_content(chunk_size=1 << 20):
+                    total += self._update(hashes, data)
+            finally:
+                resp.close()
+
+        if size >= 0 and total != size:
+            raise NetworkException("Get {} failed, {} of {} bytes received".format(url, total, size))
+        return {"size": total, "checksums": {a: h.hexdigest() for a, h in zip(algorithms, hashes)}}
+
+    @staticmethod
+    def draft_version(file_name: str, latest_version: str) -> str:
+        """
+        Next patch version of current manifest, upstream version is only used when it is
+        a valid semver string newer than current, upstream version is kept in the draft header
+        :param file_name: current manifest file name, such as "1.0.0.toml"
+        """
+        current = VersionInfo.parse(Path(file_name).stem)
+        if VersionInfo.is_valid(latest_version) and VersionInfo.parse(latest_version) > current:
+            return latest_version
+        return str(current.bump_patch())
+
+    @staticmethod
+    def _urls(files: list[ImageUrl], found: str) -> list[str]:
+        """
+        Urls of the new file, the probed one first, then other mirrors of the distfile by the same substitution.
+        Other mirrors are not probed, they sync from the same upstream.
+        """
+        name = found.rsplit("/", 1)[1]
+        latest = found.split("://", 1)[1].split("/")[int(files[0].version)]
+        ans = [found]
+        for f in files[1:]:
+            for url in ReleaseVerifier.candidates(f, latest):
+                if url.rsplit("/", 1)[1] == name and url not in ans:
+                    ans.append(url)
+                    break
+        return ans
+
+    @staticmethod
+    def _rename(obj, renames: dict):
+        """
+        Replace old distfile names referred in other tables, such as [blob] or [provisionable]
+        """
+        if isinstance(obj, dict):
+            return {k: ManifestDrafter._rename(v, renames) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [ManifestDrafter._rename(v, renames) for v in obj]
+        if isinstance(obj, str):
+            return renames.get(obj, obj)
+        return obj
+
+    def draft(self, board_image: str, file_name: str, manifest: dict, info: dict) -> tuple[str, str]:
+        """
+        :param file_name: current manifest file name
+        :param manifest: current manifest
+        :param info: check result with verified ``info["files"]``
+        :return: (draft file name, draft content)
+        """
+        found = {f["name"]: f for f in info.get("files", []) if f["found"]}
+        draft = copy.deepcopy(manifest)
+        renames = {}
+        missing = []
+        for d in draft.get("distfiles", []):
+            files = [f for f in (mirror_rules.classify(u) for u in d["urls"]) if f.valid]
+            if not files or files[0].filename not in found.keys():
+                missing.append(d["name"])
+                continue
+
+            url = found[files[0].filename]["url"]
+            algorithms = list(d.get("checksums", {}).keys()) or ManifestDrafter.DEFAULT_CHECKSUMS
+            fetched = self.fetch(url, algorithms)
+            renames[d["name"]] = url.rsplit("/", 1)[1]
+            d["name"] = renames[d["name"]]
+            d["size"] = fetched["size"]
+            d["urls"] = ManifestDrafter._urls(files, url)
+            d["checksums"] = fetched["checksums"]
+
+        for k in draft.keys():
+            if k != "distfiles":
+                draft[k] = ManifestDrafter._rename(draft[k], renames)
+
+        header = ["# Draft of board image {} generated by ruyi-reimu".format(board_image),
+                  "# Upstream {}, version {}".format(info["upstream_repo"], info["latest_version"]),
+                  "# Review it before committing to packages-index"]
+        if missing:
+            header.append("# Files not found in upstream release, kept unchanged: {}".format(", ".join(missing)))
+        return (ManifestDrafter.draft_version(file_name, info["latest_version"]) + ".toml",
+                "\n".join(header) + "\n\n" + auto_dumps(draft, ".toml"))
+
+    def draft_all(self, board_images: list[dict], results: list[tuple], out_dir: Path) -> list[Path]:
+        """
+        Write drafts of outdated board images into ``out_dir``, layout is the same as packages-index
+        :param board_images: ``Repo.board_image_raw``
+        :param results: [(board_image, info, exception)] with verified files
+        :return: draft files written
+        """
+        raw = {b["board_image"]: b for b in board_images}
+        self.reset_stats()
+        ans = []
+        for bi, info, err in results:
+            if err is not None or "latest_version" not in info.keys() or info["update"]:
+                continue
+            b = raw[bi.title]
+            try:
+                name, content = self.draft(bi.title, b["file_name"], b[bi.title], info)
+            except Exception as e:
+                logger.error("Draft manifest of board image {} failed: {}".format(bi.title, e))
+                continue
+            fp = out_dir.joinpath(PackagesIndex.BOARD_IMAGE_DIR, bi.title, name)
+            fp.parent.mkdir(parents=True, exist_ok=True)
+            with open(fp, "w") as f:
+                f.write(content)
+            logger.info("Draft manifest of board image {} written to {}".format(bi.title, fp))
+            ans.append(fp)
+
+        logger.info("Draft {} manifests, {} bytes downloaded in {} ranges"
+                    .format(len(ans), self.downloaded, self.ranges))
+        return ans
+
+
+manifest_drafter = ManifestDrafter()
@@ -0,0 +1,134 @@
+import re
+
+
+class SliceAccessor:
+    """
+    Precompiled ``repo``/``version`` index of mirrors.toml, such as "1", "-2" or "1..-2"
+    """
+    __slots__ = ("frm", "to", "single")
+
+    def __init__(self, index: str):
+        if ".." in index:
+            frm, to = index.split("..")
+            self.frm, self.to = int(frm), int(to)
+            self.single = False
+        else:
+            self.frm = self.to = int(index)
+            self.single = True
+
+    def get(self, parts: list[str]) -> list[str]:
+        """
+        :return: selected parts, empty if out of range
+        """
+        n = len(parts)
+        if self.single:
+            i = self.frm + n if self.frm < 0 else self.frm
+            if i < 0 or i >= n:
+                return []
+            return [parts[i]]
+
+        frm = self.frm + n if self.frm < 0 else self.frm
+        to = self.to + n if self.to < 0 else self.to
+        if frm < 0 or to < 0 or to >= n:
+            return []
+        return parts[frm:to + 1]
+
+
+class MirrorRule:
+    __slots__ = ("repo", "repo_name", "version", "version_index", "version_match", "version_regex")
+
+    def __init__(self, rule: dict):
+        self.repo = SliceAccessor(str(rule["repo"]))
+        # repo_name is only given when repos under one host have different layouts
+        self.repo_name = rule.get("repo_name", None)
+        self.version = str(rule["version"])
+        self.version_index = SliceAccessor(self.version)
+        self.version_match = rule.get("version_match", "")
+        self.version_regex = re.compile(self.version_match)
+
+
+class ImageUrl:
+    """
+    Classify result of one url
+    """
+    __slots__ = ("url", "valid", "host", "protocol", "parts", "repo_name",
+                 "version", "version_name", "version_match", "filename", "alternates")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.valid = False
+        self.host = ""
+        self.protocol = ""
+        # [host, path parts...]
+        self.parts = []
+        self.repo_name = None
+        self.version = ""
+        self.version_name = ""
+        self.version_match = ""
+        self.filename = ""
+        # supported urls of the same distfile on other hosts
+        self.alternates = []
+
+
+class MirrorRules:
+    """
+    Rule table compiled from mirrors.toml: host -> ordered list of ``MirrorRule``
+    """
+
+    def __init__(self):
+        self.rules = {}
+
+    def load(self, mirrors: dict):
+        rules = {}
+        for host, cfg in mirrors.items():
+            if isinstance(cfg, list):
+                rules[host] = [MirrorRule(c) for c in cfg]
+            else:
+                rules[host] = [MirrorRule(cfg)]
+        self.rules = rules
+
+    def classify(self, url: str) -> ImageUrl:
+        ans = ImageUrl(url)
+
+        # ["https:", host, path parts...]
+        parts = [p for p in url.split("/") if p and p != "."]
+        if len(parts) < 3:
+            return ans
+
+        rules = self.rules.get(parts[1])
+        if rules is None:
+            return ans
+
+        ans.host = parts[1]
+        ans.protocol = parts[0][:-1]
+        ans.parts = parts[1:]
+
+        for rule in rules:
+            if rule.repo_name is not None:
+                # check repo name
+                repo = rule.repo.get(ans.parts)
+                if not repo or repo[0] != rule.repo_name:
+                    continue
+                repo_name = rule.repo_name
+            else:
+                repo_name = rule.repo.get(ans.parts)
+                if not repo_name:
+                    continue
+
+            # check version
+            version = rule.version_index.get(ans.parts)
+            if not version or not rule.version_regex.match(version[0]):
+                continue
+
+            ans.repo_name = repo_name
+            ans.version = rule.version
+            ans.version_name = version[0]
+            ans.version_match = rule.version_match
+            ans.filename = ans.parts[-1]
+            ans.valid = True
+            break
+
+        return ans
+
+
+mirror_rules = MirrorRules()
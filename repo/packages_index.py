@@ -0,0 +1,247 @@
+import pygit2
+import shutil
+from pathlib import Path
+from semver import VersionInfo
+
+from config.loader import reimu_config
+from utils.auto_loader import auto_load, auto_loads, auto_store
+from utils.logger import logger
+
+
+class PackagesIndex:
+    """
+    Persistent local clone of packages-index, fetched incrementally.
+
+    The last processed commit and parsed board image manifests are stored in cache dir,
+    only board images changed since that commit need to be parsed again.
+    In bare mode manifests are read from git blobs, parse results are cached by blob id.
+    """
+
+    REPO_NAME = "packages-index"
+    STATE_FILE = "packages_index.json"
+    BLOB_CACHE_FILE = "packages_index_blobs.json"
+    BOARD_IMAGE_DIR = "manifests/board-image/"
+
+    def __init__(self):
+        self.path = Path()
+        self.repo = None
+        self.bare = False
+        self.commit = ""
+        self._tree = None
+
+        # last processed commit
+        self.last_commit = ""
+        # {board_image: {"file_name": str, "manifest": dict}}
+        self.manifests = {}
+
+        # {blob_id: manifest}
+        self._blob_cache = {}
+        self._blob_live = set()
+        self.blob_hits = 0
+        self.blob_misses = 0
+
+    def _state_file(self) -> Path:
+        return reimu_config.cache_dir.joinpath(PackagesIndex.STATE_FILE)
+
+    def _blob_cache_file(self) -> Path:
+        return reimu_config.cache_dir.joinpath(PackagesIndex.BLOB_CACHE_FILE)
+
+    def load_state(self):
+        self.last_commit = ""
+        self.manifests = {}
+        self._blob_cache = {}
+        self._blob_live = set()
+        self.blob_hits = 0
+        self.blob_misses = 0
+
+        fp = self._blob_cache_file()
+        if fp.is_file():
+            try:
+                self._blob_cache = auto_load(fp)
+            except Exception as e:
+                logger.warn("Broken packages-index blob cache {}, ignore it: {}".format(fp, e))
+
+        fp = self._state_file()
+        if not fp.is_file():
+            return
+        try:
+            state = auto_load(fp)
+        except Exception as e:
+            logger.warn("Broken packages-index state {}, ignore it: {}".format(fp, e))
+            return
+        if state.get("repo") != reimu_config.ruyi_repo or state.get("branch") != reimu_config.ruyi_repo_branch:
+            logger.info("packages-index repo or branch changed, ignore cached manifests")
+            return
+        self.last_commit = state.get("commit", "")
+        self.manifests = state.get("manifests", {})
+
+    def store_state(self):
+        auto_store(self._state_file(), {"repo": reimu_config.ruyi_repo,
+                                        "branch": reimu_config.ruyi_repo_branch,
+                                        "commit": self.commit,
+                                        "manifests": self.manifests})
+        if self.bare:
+            # only keep blobs still in the board image tree
+            auto_store(self._blob_cache_file(), {k: v for k, v in self._blob_cache.items() if k in self._blob_live})
+
+    def _clone(self):
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        logger.info("Clone packages-index from {}{}".format(reimu_config.ruyi_repo, " (bare)" if self.bare else ""))
+        # local transport does not support shallow fetch
+        local = reimu_config.ruyi_repo.startswith("file://") or Path(reimu_config.ruyi_repo).is_dir()
+        self.repo = pygit2.clone_repository(reimu_config.ruyi_repo, self.path, bare=self.bare,
+                                            checkout_branch=reimu_config.ruyi_repo_branch, depth=0 if local else 1)
+
+    def _open(self) -> bool:
+        try:
+            self.repo = pygit2.Repository(self.path)
+        except Exception as e:
+            logger.warn("Open packages-index clone {} failed: {}".format(self.path, e))
+            return False
+        if self.repo.is_bare != self.bare:
+            logger.info("packages-index clone {} bare mode changed, clone again".format(self.path))
+            return False
+        if "origin" not in [r.name for r in self.repo.remotes] or \
+                self.repo.remotes["origin"].url != reimu_config.ruyi_repo:
+            logger.info("packages-index clone {} has different origin, clone again".format(self.path))
+            return False
+        return True
+
+    def sync(self):
+        """
+        Fetch the latest commit of configured branch, clone when no usable local clone exists
+        """
+        self.path = reimu_config.cache_dir.joinpath(PackagesIndex.REPO_NAME)
+        self.bare = reimu_config.ruyi_repo_bare
+        self.load_state()
+
+        ref = None
+        if self.path.is_dir() and self._open():
+            logger.info("Fetch packages-index into {}".format(self.path))
+            self.repo.remotes["origin"].fetch()
+            ref = self.repo.references.get("refs/remotes/origin/" + reimu_config.ruyi_repo_branch)
+        if ref is None:
+            self._clone()
+            ref = self.repo.references.get("refs/remotes/origin/" + reimu_config.ruyi_repo_branch)
+
+        target = ref.target if ref is not None else self.repo.head.target
+        if not self.bare:
+            self.repo.reset(target, pygit2.GIT_RESET_HARD)
+        self.commit = str(target)
+        self._tree = None
+        logger.info("packages-index at commit {}, last processed {}"
+                    .format(self.commit, self.last_commit if self.last_commit else "none"))
+
+    def remote_head(self) -> str:
+        """
+        :return: commit of configured branch on remote, without fetching objects
+        """
+        remote = self.repo.remotes["origin"]
+        ref = "refs/heads/" + reimu_config.ruyi_repo_branch
+        heads = remote.list_heads() if hasattr(remote, "list_heads") else remote.ls_remotes()
+        for h in heads:
+            name, oid = (h["name"], h["oid"]) if isinstance(h, dict) else (h.name, h.oid)
+            if name == ref:
+                return str(oid)
+        return ""
+
+    def changed_board_images(self) -> set[str] | None:
+        """
+        :return: board images changed since last processed commit, None if all should be parsed
+        """
+        if not self.last_commit or not self.manifests:
+            return None
+        if self.last_commit == self.commit:
+            return set()
+
+        try:
+            old = self.repo.get(self.last_commit)
+        except Exception:
+            old = None
+        if old is None:
+            logger.info("Last processed commit {} not found, parse all board images".format(self.last_commit))
+            return None
+
+        changed = set()
+        prefix = PackagesIndex.BOARD_IMAGE_DIR
+        for d in self.repo.diff(old, self.repo.get(self.commit)).deltas:
+            for p in (d.old_file.path, d.new_file.path):
+                if p and p.startswith(prefix):
+                    changed.add(p[len(prefix):].split("/", 1)[0])
+        return changed
+
+    def _board_image_tree(self):
+        if self._tree is None:
+            self._tree = self.repo.revparse_single("{}:{}".format(self.commit, PackagesIndex.BOARD_IMAGE_DIR[:-1]))
+        return self._tree
+
+    def board_images(self) -> dict[str, list[str]]:
+        """
+        :return: {board_image: [manifest file name]}
+        """
+        ans = {}
+        if self.bare:
+            for b in self._board_image_tree():
+                if b.type_str != "tree":
+                    continue
+                ans[b.name] = []
+                for m in self.repo.get(b.id):
+                    if m.type_str == "blob":
+                        ans[b.name].append(m.name)
+                        self._blob_live.add(str(m.id))
+        else:
+            for b in self.path.joinpath("manifests", "board-image").iterdir():
+                if not b.is_dir():
+                    continue
+                ans[b.name] = [m.name for m in b.iterdir() if m.is_file()]
+        return ans
+
+    @staticmethod
+    def latest_manifest(board_image: str, files: list[str]) -> str:
+        """
+        Select the newest manifest by version in file name, files with non-semver name are skipped
+        :return: file name, empty if no valid manifest
+        """
+        latest = ""
+        latest_version = None
+        for f in files:
+            try:
+                v = VersionInfo.parse(Path(f).stem)
+            except ValueError:
+                logger.warn("Skip manifest {}/{}, invalid version in file name".format(board_image, f))
+                continue
+            if latest_version is None or v > latest_version:
+                latest, latest_version = f, v
+        return latest
+
+    def manifest_index(self) -> dict[str, str]:
+        """
+        :return: {board_image: newest manifest file name}
+        """
+        ans = {}
+        for board, files in self.board_images().items():
+            latest = PackagesIndex.latest_manifest(board, files)
+            if latest:
+                ans[board] = latest
+            else:
+                logger.warn("No valid manifest found in board image {}".format(board))
+        return ans
+
+    def load_manifest(self, board_image: str, file_name: str) -> dict:
+        if not self.bare:
+            return auto_load(self.path.joinpath("manifests", "board-image", board_image, file_name))
+
+        blob_id = str(self._board_image_tree()[board_image + "/" + file_name].id)
+        if blob_id in self._blob_cache.keys():
+            self.blob_hits += 1
+            return self._blob_cache[blob_id]
+
+        self.blob_misses += 1
+        manifest = auto_loads(self.repo.get(blob_id).data.decode("utf-8"), Path(file_name).suffix,
+                              board_image + "/" + file_name)
+        self._blob_cache[blob_id] = manifest
+        return manifest
+
+
+packages_index = PackagesIndex()
@@ -0,0 +1,114 @@
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+from utils.logger import logger
+
+
+class CheckTrace:
+    """
+    Caches used by the check running in current thread, such as "snapshot", "memo" or "listing"
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.hits = []
+
+    def hit(self, kind: str):
+        hits = getattr(self._local, "hits", None)
+        if hits is not None:
+            hits.append(kind)
+
+    def wrap(self, func):
+        """
+        :return: ``func`` recording hits into the trace of current thread when run in another thread
+        """
+        hits = getattr(self._local, "hits", None)
+
+        def run(*args, **kwargs):
+            old = getattr(self._local, "hits", None)
+            self._local.hits = hits
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.hits = old
+
+        return run
+
+    def end(self) -> list[str]:
+        hits = getattr(self._local, "hits", None)
+        self._local.hits = None
+        return hits if hits is not None else []
+
+
+class ResultSink:
+    """
+    NDJSON stream of check results, one record per board image written as soon as its check completes
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fp = None
+        self._close = False
+        self.records = 0
+
+    def open(self, output: str):
+        """
+        :param output: file path, "-" for stdout
+        """
+        self.close()
+        with self._lock:
+            if output == "-":
+                self._fp, self._close = sys.stdout, False
+            else:
+                self._fp, self._close = open(Path(output), "a", encoding="utf-8"), True
+            self.records = 0
+        logger.info("Stream check results to {}".format("stdout" if output == "-" else output))
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None and self._close:
+                self._fp.close()
+            self._fp = None
+
+    def opened(self) -> bool:
+        return self._fp is not None
+
+    @staticmethod
+    def record(board_image, info: dict, err: Exception | None, latency: float, cache: list[str]) -> dict:
+        if err is not None:
+            status = "error"
+        elif "latest_version" not in info.keys():
+            status = "unknown"
+        else:
+            status = "latest" if info["update"] else "outdated"
+        return {"time": round(time.time(), 3),
+                "board_image": board_image.title,
+                "image_type": board_image.image_type,
+                "status": status,
+                "latest_version": info.get("latest_version", ""),
+                "current_version": info.get("current_version", ""),
+                "upstream_repo": info.get("upstream_repo", ""),
+                "latency": round(latency, 3),
+                "cache_hit": len(cache) > 0,
+                "cache": cache,
+                "error": None if err is None else str(err)}
+
+    def write(self, board_image, info: dict, err: Exception | None, latency: float, cache: list[str]):
+        if self._fp is None:
+            return
+        line = json.dumps(ResultSink.record(board_image, info, err, latency, cache), ensure_ascii=False)
+        with self._lock:
+            if self._fp is None:
+                return
+            self._fp.write(line + "\n")
+            self._fp.flush()
+            self.records += 1
+
+
+check_trace = CheckTrace()
+result_sink = ResultSink()
@@ -0,0 +1,83 @@
+import hashlib
+import time
+from pathlib import Path
+
+from utils.auto_loader import auto_load, auto_store
+from utils.errors import AssertException
+from utils.logger import logger
+
+
+class Shard:
+    """
+    Subset ``index`` of ``count`` board image subsets, chosen by a stable hash of the board image name,
+    so every worker host agrees on the split without talking to each other
+    """
+
+    def __init__(self, index: int, count: int):
+        if count < 1 or not 0 <= index < count:
+            raise AssertException("Invalid shard {}/{}".format(index, count))
+        self.index = index
+        self.count = count
+
+    @staticmethod
+    def parse(shard: str) -> "Shard":
+        """
+        :param shard: "i/N", such as "0/3"
+        """
+        index, count = shard.split("/")
+        return Shard(int(index), int(count))
+
+    def __str__(self):
+        return "{}/{}".format(self.index, self.count)
+
+    def owns(self, board_image: str) -> bool:
+        h = hashlib.sha1(board_image.encode("utf-8")).digest()
+        return int.from_bytes(h[:8], "big") % self.count == self.index
+
+    def default_result_file(self) -> Path:
+        return Path("shard-{}-of-{}.json".format(self.index, self.count))
+
+    def store_results(self, fn: Path, results: list[tuple], commit: str):
+        """
+        :param results: [(board_image, info, exception)]
+        :param commit: packages-index commit checked
+        """
+        auto_store(fn, {"shard": [self.index, self.count],
+                        "commit": commit,
+                        "time": time.time(),
+                        "results": [{"board_image": bi.title,
+                                     "info": info,
+                                     "error": None if err is None else str(err)} for bi, info, err in results]})
+        logger.info("Results of shard {} stored in {}".format(self, fn))
+
+
+def merge_results(files: list[Path]) -> list[tuple]:
+    """
+    Merge result files of shards. A board image found in several files (such as a shard checked twice)
+    keeps its successful and newest result.
+    :return: [(board_image title, info, error)] sorted by title
+    """
+    # {title: (failed, -time, info, error)}
+    merged = {}
+    commits = set()
+    shards = {}
+    for fn in files:
+        data = auto_load(fn)
+        commits.add(data["commit"])
+        index, count = data["shard"]
+        shards.setdefault(count, set()).add(index)
+        for r in data["results"]:
+            rank = (r["error"] is not None, -data["time"])
+            old = merged.get(r["board_image"])
+            if old is None or rank < old[:2]:
+                merged[r["board_image"]] = rank + (r["info"], r["error"])
+
+    if len(commits) > 1:
+        logger.warn("Shards checked different packages-index commits: {}".format(", ".join(sorted(commits))))
+    for count, indexes in shards.items():
+        missing = sorted(set(range(count)) - indexes)
+        if missing:
+            logger.warn("Results of shards {} of {} are missing".format(", ".join(str(i) for i in missing), count))
+    logger.info("Merge {} board image results from {} files".format(len(merged), len(files)))
+
+    return [(title, m[2], m[3]) for title, m in sorted(merged.items())]
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from config.loader import reimu_config
+from utils.logger import logger
+from .result_sink import check_trace
+
+
+class SnapshotStore:
+    """
+    SQLite store of upstream release lists and reported versions.
+
+    Upstreams fetched within ``reimu_config.check_ttl`` seconds are not fetched again,
+    issues are only sent when the latest upstream version changed since last report.
+    """
+
+    DB_FILE = "snapshot.db"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.fresh_hits = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(reimu_config.cache_dir.joinpath(SnapshotStore.DB_FILE),
+                                       check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS upstreams ("
+                             "key TEXT PRIMARY KEY, releases TEXT NOT NULL, "
+                             "content_hash TEXT NOT NULL, fetched_at REAL NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS reports ("
+                             "board_image TEXT PRIMARY KEY, latest_version TEXT NOT NULL, "
+                             "reported_at REAL NOT NULL)")
+            self._db.commit()
+        return self._db
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def reset_stats(self):
+        with self._lock:
+            self.fresh_hits = 0
+
+    def get_upstream(self, key: str) -> dict | None:
+        """
+        :return: {"releases": list[str], "content_hash": str, "fetched_at": float}
+        """
+        with self._lock:
+            row = self._conn().execute("SELECT releases, content_hash, fetched_at FROM upstreams WHERE key = ?",
+                                       (key,)).fetchone()
+        if row is None:
+            return None
+        return {"releases": json.loads(row[0]), "content_hash": row[1], "fetched_at": row[2]}
+
+    def _fresh(self, key: str) -> dict | None:
+        if reimu_config.check_ttl <= 0:
+            return None
+        snapshot = self.get_upstream(key)
+        if snapshot is None or time.time() - snapshot["fetched_at"] > reimu_config.check_ttl:
+            return None
+        return snapshot
+
+    def is_fresh(self, key: str) -> bool:
+        return self._fresh(key) is not None
+
+    def fresh_releases(self, key: str) -> list[str] | None:
+        """
+        :return: releases fetched within ttl, None if should fetch again
+        """
+        snapshot = self._fresh(key)
+        if snapshot is None:
+            return None
+        with self._lock:
+            self.fresh_hits += 1
+        return snapshot["releases"]
+
+    def put_upstream(self, key: str, releases: list[str]) -> list[str]:
+        """
+        :return: releases not in last snapshot
+        """
+        content = json.dumps(releases)
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        old = self.get_upstream(key)
+
+        with self._lock:
+            conn = self._conn()
+            if old is not None and old["content_hash"] == content_hash:
+                conn.execute("UPDATE upstreams SET fetched_at = ? WHERE key = ?", (time.time(), key))
+            else:
+                conn.execute("INSERT OR REPLACE INTO upstreams (key, releases, content_hash, fetched_at) "
+                             "VALUES (?, ?, ?, ?)", (key, content, content_hash, time.time()))
+            conn.commit()
+
+        if old is None:
+            return list(releases)
+        if old["content_hash"] == content_hash:
+            return []
+        old_releases = set(old["releases"])
+        new = [r for r in releases if r not in old_releases]
+        if new:
+            logger.info("Upstream {} has {} new releases: {}".format(key, len(new), ", ".join(new)))
+        return new
+
+    def releases(self, key: str, fetch) -> list[str]:
+        """
+        Releases of an upstream, from snapshot if fresh, else fetch and store
+        :param fetch: callable, return release names, or (release names, complete),
+                      incomplete release lists are not stored, other users of the key may need older releases
+        """
+        cached = self.fresh_releases(key)
+        if cached is not None:
+            check_trace.hit("snapshot")
+            return cached
+        releases = fetch()
+        if isinstance(releases, tuple):
+            releases, complete = releases
+            if not complete:
+                return releases
+        self.put_upstream(key, releases)
+        return releases
+
+    def reported_version(self, board_image: str) -> str:
+        with self._lock:
+            row = self._conn().execute("SELECT latest_version FROM reports WHERE board_image = ?",
+                                       (board_image,)).fetchone()
+        return row[0] if row is not None else ""
+
+    def set_reported(self, board_image: str, latest_version: str):
+        with self._lock:
+            conn = self._conn()
+            conn.execute("INSERT OR REPLACE INTO reports (board_image, latest_version, reported_at) "
+                         "VALUES (?, ?, ?)", (board_image, latest_version, time.time()))
+            conn.commit()
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,122 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config.loader import reimu_config
+from utils.http_session import HttpSession, http_session
+from utils.logger import logger
+from .check_pool import HostLimiter
+from .mirror_rules import ImageUrl
+
+
+class ReleaseVerifier:
+    """
+    Check that the latest upstream release contains files of a board image.
+
+    Candidate urls of each file are derived from its current url: the version part of the path
+    is replaced by the latest version, the filename is kept or has its version replaced too.
+    Candidates are probed with concurrent HEAD requests, no directory is crawled.
+    """
+
+    def __init__(self, session: HttpSession = None):
+        self.session = session if session is not None else http_session
+        self._lock = threading.Lock()
+        self.probes = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self.probes = 0
+
+    @staticmethod
+    def _replace_version(name: str, current: str, latest: str) -> list[str]:
+        """
+        :return: candidate filenames, version replaced ones first
+        """
+        ans = []
+        if current and current in name:
+            ans.append(name.replace(current, latest))
+        # tags such as v1.2.0, filenames may only contain 1.2.0
+        if current[:1] == "v" and latest[:1] == "v" and current[1:] and current[1:] in name:
+            ans.append(name.replace(current[1:], latest[1:]))
+        ans.append(name)
+        return list(dict.fromkeys(ans))
+
+    @staticmethod
+    def candidates(f: ImageUrl, latest: str) -> list[str]:
+        """
+        :return: candidate urls of file ``f`` in release ``latest``
+        """
+        parts = list(f.parts)
+        idx = int(f.version)
+        if idx < 0:
+            idx = len(parts) + idx
+        parts[idx] = latest
+        prefix = "{}://{}/".format(f.protocol, "/".join(parts[:-1]))
+        return [prefix + n for n in ReleaseVerifier._replace_version(f.filename, f.version_name, latest)]
+
+    def _probe(self, limiter: HostLimiter, host: str, url: str) -> dict | None:
+        """
+        :return: {"url": str, "size": int}, None if not found
+        """
+        limiter.acquire([host])
+        try:
+            with self._lock:
+                self.probes += 1
+            resp = self.session.head(url, allow_redirects=True)
+            if resp.status_code in (405, 501):
+                # HEAD not allowed, only read headers of GET
+                resp = self.session.get(url, allow_redirects=True, stream=True)
+                resp.close()
+        except Exception as e:
+            logger.warn("Probe {} failed: {}".format(url, e))
+            return None
+        finally:
+            limiter.release([host])
+        if resp.status_code != 200:
+            return None
+        size = resp.headers.get("Content-Length", "")
+        return {"url": url, "size": int(size) if size.isdigit() else -1}
+
+    @staticmethod
+    def _expected(board_image, info: dict) -> list[ImageUrl]:
+        """
+        Files of the current version, or all files when no version is current
+        """
+        files = [f for f in board_image.files if f.version_name == info["current_version"]]
+        if not files:
+            files = board_image.files
+        return list({f.filename: f for f in files}.values())
+
+    def verify(self, checks: list[tuple]):
+        """
+        Probe files of several board images concurrently, each ``info`` gets
+        ``info["files"] = [{"name": str, "found": bool, "url": str, "size": int}]``
+        :param checks: [(board_image, info)]
+        """
+        limiter = HostLimiter(reimu_config.check_host_workers)
+        jobs = []
+        with ThreadPoolExecutor(max_workers=reimu_config.check_verify_workers,
+                                thread_name_prefix="reimu-verify") as executor:
+            for bi, info in checks:
+                for f in ReleaseVerifier._expected(bi, info):
+                    futures = [executor.submit(self._probe, limiter, f.host, url)
+                               for url in ReleaseVerifier.candidates(f, info["latest_version"])]
+                    jobs.append((bi, info, f, futures))
+
+            for bi, info in checks:
+                info["files"] = []
+            for bi, info, f, futures in jobs:
+                found = None
+                for fu in futures:
+                    found = fu.result()
+                    if found is not None:
+                        break
+                if found is None:
+                    logger.warn("File {} of board image {} not found in upstream release {}"
+                                .format(f.filename, bi.title, info["latest_version"]))
+                    info["files"].append({"name": f.filename, "found": False, "url": "", "size": -1})
+                else:
+                    info["files"].append({"name": f.filename, "found": True, "url": found["url"],
+                                          "size": found["size"]})
+
+
+release_verifier = ReleaseVerifier()
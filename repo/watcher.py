@@ -0,0 +1,144 @@
+import random
+import time
+
+from config.loader import reimu_config
+from utils.logger import logger
+from .loader import ruyi_repo
+from .packages_index import packages_index
+
+
+class UpstreamSchedule:
+    __slots__ = ("next_due", "failures")
+
+    def __init__(self, next_due: float):
+        self.next_due = next_due
+        self.failures = 0
+
+
+class RepoWatcher:
+    """
+    Long-running check loop, config/git state/http pools stay warm between checks.
+
+    Each upstream is checked on its own interval with jitter, failed upstreams back off exponentially.
+    packages-index is loaded again only when its branch head moves.
+    """
+
+    RETRY_BASE = 60
+    MAX_SLEEP = 60
+
+    def __init__(self):
+        # {snapshot_key: UpstreamSchedule}
+        self.schedule = {}
+        self.next_index_check = 0.0
+        self.rounds = 0
+
+    @staticmethod
+    def poll_interval(board_image) -> float:
+        interval = reimu_config.watch_interval
+        for h in board_image.hosts:
+            mirror = reimu_config.ruyi_repo_mirrors.get(h, {})
+            mirrors = mirror if isinstance(mirror, list) else [mirror]
+            for m in mirrors:
+                if "poll_interval" in m.keys():
+                    interval = min(interval, int(m["poll_interval"]))
+        return max(60, interval)
+
+    @staticmethod
+    def _jitter(interval: float) -> float:
+        return interval * (1 + random.uniform(-reimu_config.watch_jitter, reimu_config.watch_jitter))
+
+    def _sync_index(self, now: float) -> bool:
+        """
+        :return: packages-index reloaded
+        """
+        if now < self.next_index_check:
+            return False
+        self.next_index_check = now + self._jitter(reimu_config.watch_index_interval)
+
+        try:
+            head = packages_index.remote_head()
+        except Exception as e:
+            logger.warn("Get packages-index remote head failed: {}".format(e))
+            return False
+        if not head or head == packages_index.commit:
+            return False
+
+        logger.info("packages-index head moved to {}, load again".format(head))
+        ruyi_repo.load()
+        ruyi_repo.check_begin()
+        ruyi_repo.check_urls()
+        return True
+
+    def _update(self, results: list[tuple], now: float):
+        failed = {}
+        intervals = {}
+        for board_image, info, err in results:
+            key = board_image.snapshot_key
+            failed[key] = failed.get(key, False) or err is not None
+            intervals[key] = min(intervals.get(key, reimu_config.watch_interval),
+                                 RepoWatcher.poll_interval(board_image))
+
+        for key, f in failed.items():
+            sc = self.schedule[key]
+            if f:
+                sc.failures += 1
+                delay = min(RepoWatcher.RETRY_BASE * 2 ** (sc.failures - 1), reimu_config.watch_max_backoff)
+                logger.warn("Upstream {} failed {} times, retry in {}s".format(key, sc.failures, int(delay)))
+            else:
+                sc.failures = 0
+                delay = intervals[key]
+            sc.next_due = now + self._jitter(delay)
+
+    def run_once(self) -> float:
+        """
+        Check all due upstreams
+        :return: seconds to sleep before next round
+        """
+        now = time.time()
+        self._sync_index(now)
+
+        board_images = ruyi_repo.repo_board_images()
+        keys = set()
+        due = []
+        for bi in board_images:
+            keys.add(bi.snapshot_key)
+            if bi.snapshot_key not in self.schedule.keys():
+                # spread first checks of upstreams over one interval
+                self.schedule[bi.snapshot_key] = UpstreamSchedule(
+                    now + random.uniform(0, RepoWatcher.poll_interval(bi)) if self.rounds else now)
+            if self.schedule[bi.snapshot_key].next_due <= now:
+                due.append(bi)
+        # upstreams removed from packages-index
+        for k in set(self.schedule.keys()) - keys:
+            self.schedule.pop(k)
+
+        if due:
+            logger.info("Watch round {}: {} board images due".format(self.rounds, len(due)))
+            ruyi_repo.check_begin()
+            results = ruyi_repo.check_upstreams(due)
+            ruyi_repo.check_end()
+            self._update(results, time.time())
+        self.rounds += 1
+
+        next_due = min([sc.next_due for sc in self.schedule.values()] + [self.next_index_check])
+        return min(max(0.0, next_due - time.time()), RepoWatcher.MAX_SLEEP)
+
+    def run(self):
+        if reimu_config.check_ttl > 0:
+            logger.info("Watch mode schedules upstream checks itself, snapshot ttl disabled")
+            reimu_config.check_ttl = 0
+
+        ruyi_repo.check_begin()
+        ruyi_repo.check_urls()
+        self.next_index_check = time.time() + self._jitter(reimu_config.watch_index_interval)
+
+        while True:
+            try:
+                sleep = self.run_once()
+            except Exception as e:
+                logger.error("Watch round {} failed: {}".format(self.rounds, e))
+                sleep = RepoWatcher.MAX_SLEEP
+            time.sleep(sleep)
+
+
+repo_watcher = RepoWatcher()
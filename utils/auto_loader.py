@@ -5,10 +5,18 @@ from .errors import ParseException
 
 
 def auto_load(fn: str | Path) -> dict:
-    s = Path(fn).suffix
     with open(fn, "r") as fp:
         c = fp.read()
 
+    return auto_loads(c, Path(fn).suffix, str(fn))
+
+
+def auto_loads(c: str, s: str, fn: str = "") -> dict:
+    """
+    :param c: file content
+    :param s: file suffix, such as ".toml"
+    :param fn: file name, only used in error message
+    """
     if s == ".json":
         import json
         return json.loads(c)
@@ -19,17 +27,71 @@ def auto_load(fn: str | Path) -> dict:
         import yaml
         return yaml.safe_load(c)
     else:
-        raise ParseException("Unsupported file: " + fn)
+        raise ParseException("Unsupported file: " + (fn if fn else s))
 
 
-def auto_store(fn: str | Path, fc: dict):
-    s = Path(fn).suffix
+def _toml_key(k: str) -> str:
+    import re
+    if re.fullmatch(r"[A-Za-z0-9_-]+", k):
+        return k
+    return _toml_value(k)
+
+
+def _toml_value(v) -> str:
+    import json
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    elif isinstance(v, (int, float)):
+        return repr(v)
+    elif isinstance(v, str):
+        # escapes of json strings are valid in toml basic strings
+        return json.dumps(v, ensure_ascii=False)
+    elif isinstance(v, list):
+        return "[" + ", ".join(_toml_value(i) for i in v) + "]"
+    elif isinstance(v, dict):
+        return "{ " + ", ".join("{} = {}".format(_toml_key(k), _toml_value(i)) for k, i in v.items()) + " }"
+    elif hasattr(v, "isoformat"):
+        return v.isoformat()
+    else:
+        raise ParseException("Unsupported toml value: " + repr(v))
+
+
+def _is_table_array(v) -> bool:
+    return isinstance(v, list) and len(v) > 0 and all(isinstance(i, dict) for i in v)
 
-    if s == '.json':
+
+def _toml_table(fc: dict, path: str, lines: list[str]):
+    for k, v in fc.items():
+        if not isinstance(v, dict) and not _is_table_array(v):
+            lines.append("{} = {}".format(_toml_key(k), _toml_value(v)))
+    for k, v in fc.items():
+        sub = path + _toml_key(k)
+        if isinstance(v, dict):
+            lines += ["", "[{}]".format(sub)]
+            _toml_table(v, sub + ".", lines)
+        elif _is_table_array(v):
+            for i in v:
+                lines += ["", "[[{}]]".format(sub)]
+                _toml_table(i, sub + ".", lines)
+
+
+def auto_dumps(fc: dict, s: str) -> str:
+    """
+    :param s: file suffix, such as ".toml"
+    """
+    if s == ".json":
         import json
-        c = json.dumps(fc)
+        return json.dumps(fc)
+    elif s == ".toml":
+        lines = []
+        _toml_table(fc, "", lines)
+        return "\n".join(lines).lstrip("\n") + "\n"
     else:
-        raise ParseException("Unsupported file: " + fn)
+        raise ParseException("Unsupported file: " + s)
+
+
+def auto_store(fn: str | Path, fc: dict):
+    c = auto_dumps(fc, Path(fn).suffix)
 
     with open(fn, "w") as fp:
         fp.write(c)
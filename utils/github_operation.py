@@ -1,40 +1,350 @@
 
-from github import Auth, Github
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
+from github import Auth, Github, GithubException
+
+from .auto_loader import auto_load, auto_store
+from .errors import NetworkException
+from .github_scheduler import GithubScheduler
+from .http_session import http_session
 from .logger import logger
 
 
+class GithubRelease:
+    """
+    Release fetched by GraphQL, attributes named as ``github.GitRelease``
+    """
+    __slots__ = ("tag_name", "published_at", "assets")
+
+    def __init__(self, tag_name: str, published_at: str, assets: list[str]):
+        self.tag_name = tag_name
+        self.published_at = published_at
+        self.assets = assets
+
+
 class GithubOperation:
+    GRAPHQL_URL = "https://api.github.com/graphql"
+    # keep each query far below the GraphQL node limit (500,000)
+    GRAPHQL_NODE_BUDGET = 50000
+    GRAPHQL_MAX_REPOS = 50
+    ISSUE_PREFIX = "[ruyi-reimu]"
+    ISSUE_INDEX_FILE = "issue_index.json"
+    IDENTITY_FILE = "github_identity.json"
+    IDENTITY_TTL = 86400
+
     def __init__(self):
         self.name = None
-        self.gh = Github()
+        self._gh = None
+        self._gh_args = {}
+        self._login_lock = threading.Lock()
+        self._token = ""
+        self.api_url = "https://api.github.com"
+        self.graphql_url = GithubOperation.GRAPHQL_URL
+
+        # {"owner/name": ([GithubRelease], truncated)}
+        self._releases = {}
+        self._releases_lock = threading.Lock()
+
+        self.cache_dir = None
+        # {"owner/name": {"since": str, "issues": {title: number}}}
+        self._issue_index = {}
+        self._issue_synced = set()
+        self._issue_lock = threading.Lock()
+
+        self.scheduler = GithubScheduler()
+        # {(repo, title): (body, on_done)}, issue writes are sent after all reads
+        self._issue_queue = {}
+
+    def init(self, token: str, cache_dir: Path = None, api_url: str = "https://api.github.com", **github_args):
+        """
+        Keep settings only, client is created and token validated on first GitHub operation
+        :param github_args: extra arguments of ``github.Github``
+        """
+        with self._login_lock:
+            self._token = token
+            self.cache_dir = cache_dir
+            self.api_url = api_url
+            self._gh_args = github_args
+            self._gh = None
+            self.name = None
+        # GitHub Enterprise serves REST at /api/v3 and GraphQL at /api/graphql
+        self.graphql_url = (api_url[:-3] if api_url.endswith("/v3") else api_url) + "/graphql"
+
+    def _client(self) -> Github:
+        with self._login_lock:
+            if self._gh is None:
+                self._login()
+            return self._gh
+
+    @property
+    def gh(self) -> Github:
+        return self._client()
+
+    def _identity_key(self) -> str:
+        # token itself is never stored
+        return hashlib.sha256("{}\n{}".format(self.api_url, self._token).encode("utf-8")).hexdigest()
+
+    def _identity_file(self) -> Path:
+        if self.cache_dir is None:
+            return None
+        return Path(self.cache_dir).joinpath(GithubOperation.IDENTITY_FILE)
+
+    def _login(self):
+        """
+        Create client and check token validation, a validated identity is cached for ``IDENTITY_TTL`` seconds
+        """
+        gh = Github(base_url=self.api_url, auth=Auth.Token(self._token), **self._gh_args)
+
+        key = self._identity_key()
+        fp = self._identity_file()
+        if fp is not None and fp.is_file():
+            try:
+                identity = auto_load(fp)
+                if identity["key"] == key and time.time() - identity["time"] <= GithubOperation.IDENTITY_TTL:
+                    self._gh, self.name = gh, identity["name"]
+                    return
+            except Exception as e:
+                logger.warn("Broken GitHub identity cache {}, ignore it: {}".format(fp, e))
+
+        name = self.scheduler.call(lambda: gh.get_user().name)
+        logger.info("Login GitHub as {}".format(name))
+        if fp is not None:
+            auto_store(fp, {"key": key, "name": name, "time": time.time()})
+        self._gh, self.name = gh, name
+
+    def _call(self, func, *args, write: bool = False, **kwargs):
+        """
+        Run REST operation through scheduler, rate limit state is read from the last response
+        """
+        ans = self.scheduler.call(func, *args, write=write, **kwargs)
+        # parsed from response headers by the requester, Github.rate_limiting would request
+        # /rate_limit when no response had rate limit headers yet
+        requester = self.gh.requester
+        remaining, limit = requester.rate_limiting
+        if limit >= 0:
+            self.scheduler.update_state(remaining, limit, requester.rate_limiting_resettime)
+        return ans
+
+    def _graphql_post(self, query: str, variables: dict):
+        resp = http_session.request("POST", self.graphql_url,
+                                    json={"query": query, "variables": variables},
+                                    headers={"Authorization": "bearer " + self._token})
+        if resp.status_code in (403, 429):
+            # scheduler pauses and retries when it is about rate limit
+            raise GithubException(resp.status_code, {"message": resp.text[:500]}, dict(resp.headers))
+        return resp
+
+    def _graphql(self, query: str, variables: dict) -> dict:
+        # token is validated before the first query
+        self._client()
+        resp = self.scheduler.call(self._graphql_post, query, variables, kind="graphql")
+        if resp.status_code != 200:
+            raise NetworkException("GraphQL query get code {}".format(resp.status_code))
+        ans = resp.json()
+        for e in ans.get("errors", []):
+            logger.warn("GraphQL query error: {}".format(e.get("message", e)))
+        return ans.get("data") or {}
 
-    def init(self, token: str):
-        # check token validation
-        self.gh = Github(auth=Auth.Token(token))
-        self.name = self.gh.get_user().name
+    @staticmethod
+    def _releases_query(repos: list[str], count: int, assets: int) -> (str, dict):
+        params = []
+        fields = []
+        variables = {}
+        for i, r in enumerate(repos):
+            owner, name = r.split("/", 1)
+            params.append("$o{0}: String!, $n{0}: String!".format(i))
+            fields.append("r{0}: repository(owner: $o{0}, name: $n{0}) {{ releases(first: {1}, "
+                          "orderBy: {{field: CREATED_AT, direction: DESC}}) {{ pageInfo {{ hasNextPage }} "
+                          "nodes {{ tagName publishedAt releaseAssets(first: {2}) {{ nodes {{ name }} }} }} }} }}"
+                          .format(i, count, assets))
+            variables["o{}".format(i)] = owner
+            variables["n{}".format(i)] = name
+        query = "query({}) {{ {} rateLimit {{ cost remaining }} }}".format(", ".join(params), " ".join(fields))
+        return query, variables
 
-    def get_repo_releases(self, repo: str):
-        return self.gh.get_repo(repo).get_releases()
+    def prefetch_releases(self, repos: list[str], count: int = 20, assets: int = 50):
+        """
+        Fetch the latest ``count`` releases of all ``repos`` with batched GraphQL queries,
+        ``get_repo_releases`` will use these results.
+        :param repos: ["owner/name"]
+        :param count: releases per repo
+        :param assets: asset names per release
+        """
+        repos = sorted(set(repos) - set(self._releases.keys()))
+        if not repos:
+            return
+
+        chunk = GithubOperation.GRAPHQL_NODE_BUDGET // (count * (assets + 1))
+        chunk = max(1, min(chunk, GithubOperation.GRAPHQL_MAX_REPOS))
+        for c in range(0, len(repos), chunk):
+            repo_chunk = repos[c:c + chunk]
+            query, variables = GithubOperation._releases_query(repo_chunk, count, assets)
+            try:
+                data = self._graphql(query, variables)
+            except Exception as e:
+                logger.warn("Prefetch releases of {} repos failed: {}".format(len(repo_chunk), e))
+                continue
+
+            with self._releases_lock:
+                for i, r in enumerate(repo_chunk):
+                    rd = data.get("r{}".format(i))
+                    if not rd:
+                        continue
+                    releases = [GithubRelease(n["tagName"], n["publishedAt"],
+                                              [a["name"] for a in n["releaseAssets"]["nodes"]])
+                                for n in rd["releases"]["nodes"]]
+                    self._releases[r] = (releases, rd["releases"]["pageInfo"]["hasNextPage"])
+            if "rateLimit" in data.keys() and data["rateLimit"]:
+                logger.info("Prefetch releases of {} repos, cost {}, remaining {}"
+                            .format(len(repo_chunk), data["rateLimit"]["cost"], data["rateLimit"]["remaining"]))
+
+    def clear_releases(self):
+        with self._releases_lock:
+            self._releases = {}
+
+    def get_repo_releases(self, repo: str, tags=None):
+        """
+        :param repo: "owner/name"
+        :param tags: tags the caller looking for, prefetched releases are used only when
+                     they are complete or contain one of these tags
+        :return: releases sorted by created time, newest first
+        """
+        return self.get_repo_releases_complete(repo, tags)[0]
+
+    def get_repo_releases_complete(self, repo: str, tags=None) -> tuple[list, bool]:
+        """
+        Same as ``get_repo_releases``
+        :return: (releases, complete), complete is False when only a truncated prefetch is returned
+        """
+        with self._releases_lock:
+            cached = self._releases.get(repo)
+        if cached is not None:
+            releases, truncated = cached
+            if not truncated or tags is None or any(r.tag_name in tags for r in releases):
+                return releases, not truncated
+        return self._call(lambda: list(self.gh.get_repo(repo).get_releases())), True
 
     def get_repo_latest_release(self, repo: str):
-        return self.gh.get_repo(repo).get_latest_release()
+        return self._call(lambda: self.gh.get_repo(repo).get_latest_release())
+
+    def _issue_index_file(self) -> Path:
+        if self.cache_dir is None:
+            return None
+        return Path(self.cache_dir).joinpath(GithubOperation.ISSUE_INDEX_FILE)
+
+    def _load_issue_index(self):
+        fp = self._issue_index_file()
+        if fp is None or not fp.is_file():
+            return
+        try:
+            self._issue_index = auto_load(fp)
+        except Exception as e:
+            logger.warn("Broken issue index {}, rebuild it: {}".format(fp, e))
+            self._issue_index = {}
+
+    def _store_issue_index(self):
+        fp = self._issue_index_file()
+        if fp is not None:
+            auto_store(fp, self._issue_index)
+
+    def _sync_issue_index(self, repo) -> dict:
+        """
+        Sync ``[ruyi-reimu]`` issues of repo once per run, only issues updated since last sync are listed
+        :param repo: github.Repository
+        :return: {title: number}
+        """
+        name = repo.full_name
+        if name in self._issue_synced:
+            return self._issue_index[name]["issues"]
+
+        if not self._issue_index:
+            self._load_issue_index()
+        index = self._issue_index.setdefault(name, {"since": "", "issues": {}})
+
+        # a little overlap, issues updated while listing will not be missed
+        now = datetime.now(timezone.utc) - timedelta(minutes=5)
+        if index["since"]:
+            issues = self._call(lambda: [(i.title, i.number) for i in repo.get_issues(
+                state="all", since=datetime.fromisoformat(index["since"]))])
+        else:
+            issues = self._call(lambda: [(i.title, i.number) for i in repo.get_issues(state="all")])
+        for title, number in issues:
+            if title.startswith(GithubOperation.ISSUE_PREFIX):
+                index["issues"][title] = number
+        index["since"] = now.isoformat()
+
+        self._issue_synced.add(name)
+        self._store_issue_index()
+        logger.info("Issue index of repo {} synced, {} issues".format(name, len(index["issues"])))
+        return index["issues"]
+
+    def clear_issue_sync(self):
+        """
+        Issue index will be synced again on next create_issue
+        """
+        with self._issue_lock:
+            self._issue_synced = set()
 
     def create_issue(self, repo: str, title: str, body: str):
-        repo = self.gh.get_repo(repo)
-        for i in repo.get_issues(state="all"):
-            if i.title == title:
-                if i.state == "open":
-                    i.edit(body=body)
-                    logger.info(f"Issue \"{title}\" already opened and updated in repo {repo.full_name}")
-                else:
-                    i.edit(state="open", body=body)
-                    i.create_comment(f"Issue reopened with updated content: {body}")
-                    logger.info(f"Issue \"{title}\" was reopened and updated in repo {repo.full_name}")
-                return
-
-        repo.create_issue(title=title, body=body)
-        logger.info(f"Issue \"{title}\" created in repo {repo.full_name}")
+        repo = self._call(self.gh.get_repo, repo)
+        with self._issue_lock:
+            index = self._sync_issue_index(repo)
+
+            if title in index.keys():
+                try:
+                    i = self._call(repo.get_issue, index[title])
+                except GithubException as e:
+                    if e.status not in (404, 410):
+                        raise
+                    # deleted issue
+                    i = None
+                # transferred issue is followed to another repo
+                if i is not None and i.title == title and \
+                        i.repository.full_name.lower() == repo.full_name.lower():
+                    if i.state == "open":
+                        self._call(i.edit, body=body, write=True)
+                        logger.info(f"Issue \"{title}\" already opened and updated in repo {repo.full_name}")
+                    else:
+                        self._call(i.edit, state="open", body=body, write=True)
+                        self._call(i.create_comment, f"Issue reopened with updated content: {body}", write=True)
+                        logger.info(f"Issue \"{title}\" was reopened and updated in repo {repo.full_name}")
+                    return
+                # renamed, deleted or transferred issue
+                logger.info("Issue #{} \"{}\" no longer in repo {}, create a new one"
+                            .format(index[title], title, repo.full_name))
+                index.pop(title)
+
+            i = self._call(repo.create_issue, title=title, body=body, write=True)
+            if title.startswith(GithubOperation.ISSUE_PREFIX):
+                index[title] = i.number
+            self._store_issue_index()
+            logger.info(f"Issue \"{title}\" created in repo {repo.full_name}")
+
+    def queue_issue(self, repo: str, title: str, body: str, on_done=None):
+        """
+        Queue an issue upsert, sent by ``flush_issues``.
+        Later upserts of the same issue replace earlier ones.
+        :param on_done: callable, called after the issue was sent
+        """
+        with self._issue_lock:
+            self._issue_queue[(repo, title)] = (body, on_done)
+
+    def flush_issues(self):
+        with self._issue_lock:
+            queue, self._issue_queue = self._issue_queue, {}
+
+        for (repo, title), (body, on_done) in queue.items():
+            try:
+                self.create_issue(repo, title, body)
+            except Exception as e:
+                logger.error("Send issue \"{}\" to repo {} failed: {}".format(title, repo, e))
+                continue
+            if on_done is not None:
+                on_done()
 
 
 gh_op = GithubOperation()
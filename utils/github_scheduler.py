@@ -0,0 +1,164 @@
+import threading
+import time
+
+from github import GithubException, RateLimitExceededException
+
+from .logger import logger
+
+
+class GithubScheduler:
+    """
+    Central scheduler of GitHub API calls.
+
+    Rate limit state comes from ``X-RateLimit-*`` headers. Calls pause until reset when the
+    quota is nearly used up and are retried instead of failing when GitHub rejects them.
+    Reads go before writes: a write waits while reads are pending (at most ``WRITE_MAX_DEFER`` seconds,
+    so continuous reads cannot starve it), writes are paced.
+    """
+
+    # keep some quota for issue writes
+    RESERVE = 10
+    WRITE_INTERVAL = 1.0
+    WRITE_MAX_DEFER = 30.0
+    MAX_RETRY = 5
+    DEFAULT_WAIT = 60.0
+    MAX_WAIT = 3600.0
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._reads_pending = 0
+        self._last_write = 0.0
+
+        self.remaining = -1
+        self.limit = -1
+        self.reset_time = 0.0
+
+        self.calls = {"read": 0, "write": 0, "graphql": 0, "retry": 0}
+        self.waited = 0.0
+
+    def reset_stats(self):
+        with self._cond:
+            self.calls = {"read": 0, "write": 0, "graphql": 0, "retry": 0}
+            self.waited = 0.0
+
+    def update(self, headers: dict):
+        """
+        Update rate limit state from response headers
+        """
+        if not headers:
+            return
+        h = {k.lower(): v for k, v in headers.items()}
+        try:
+            with self._cond:
+                if "x-ratelimit-remaining" in h.keys():
+                    self.remaining = int(h["x-ratelimit-remaining"])
+                if "x-ratelimit-limit" in h.keys():
+                    self.limit = int(h["x-ratelimit-limit"])
+                if "x-ratelimit-reset" in h.keys():
+                    self.reset_time = float(h["x-ratelimit-reset"])
+        except ValueError:
+            pass
+
+    def update_state(self, remaining: int, limit: int, reset_time: float):
+        with self._cond:
+            self.remaining, self.limit, self.reset_time = remaining, limit, reset_time
+
+    def _sleep(self, seconds: float, reason: str):
+        seconds = min(max(seconds, 1.0), GithubScheduler.MAX_WAIT)
+        logger.warn("GitHub {}, pause for {}s".format(reason, int(seconds)))
+        time.sleep(seconds)
+        with self._cond:
+            self.waited += seconds
+
+    def _wait_quota(self, write: bool):
+        """
+        Reads pause when only ``RESERVE`` calls are left, the reserve is spent by writes only
+        """
+        with self._cond:
+            low = 0 <= self.remaining <= (0 if write else GithubScheduler.RESERVE)
+            wait = self.reset_time - time.time()
+        if low and wait > 0:
+            self._sleep(wait + 1, "rate limit nearly used up ({} left)".format(self.remaining))
+            with self._cond:
+                self.remaining = -1
+
+    @staticmethod
+    def _retry_wait(e: GithubException) -> float:
+        headers = {k.lower(): v for k, v in (e.headers or {}).items()}
+        if "retry-after" in headers.keys():
+            return float(headers["retry-after"])
+        if headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers.keys():
+            return float(headers["x-ratelimit-reset"]) - time.time() + 1
+        return GithubScheduler.DEFAULT_WAIT
+
+    @staticmethod
+    def _is_rate_limited(e: GithubException) -> bool:
+        """
+        403 is also sent for SSO enforcement, blocked token or missing permission, those are not retried
+        """
+        if isinstance(e, RateLimitExceededException):
+            return True
+        if e.status not in (403, 429):
+            return False
+        headers = {k.lower(): v for k, v in (e.headers or {}).items()}
+        if "retry-after" in headers.keys() or headers.get("x-ratelimit-remaining") == "0":
+            return True
+        # also matches "secondary rate limit"
+        return "rate limit" in str(e.data).lower()
+
+    def call(self, func, *args, write: bool = False, kind: str = "", **kwargs):
+        """
+        Run one GitHub API operation
+        :param write: issue writes wait for pending reads and are paced
+        :param kind: counter name, default "write" or "read"
+        """
+        kind = kind if kind else ("write" if write else "read")
+        with self._cond:
+            if write:
+                deadline = time.monotonic() + GithubScheduler.WRITE_MAX_DEFER
+                while self._reads_pending > 0:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        logger.debug("GitHub write deferred {}s by reads, send it now"
+                                     .format(GithubScheduler.WRITE_MAX_DEFER))
+                        break
+                    self._cond.wait(left)
+            else:
+                self._reads_pending += 1
+
+        try:
+            for retry in range(GithubScheduler.MAX_RETRY + 1):
+                self._wait_quota(write)
+                if write:
+                    with self._cond:
+                        pace = self._last_write + GithubScheduler.WRITE_INTERVAL - time.time()
+                    if pace > 0:
+                        time.sleep(pace)
+
+                with self._cond:
+                    self.calls[kind] = self.calls.get(kind, 0) + 1
+                    if retry:
+                        self.calls["retry"] += 1
+                try:
+                    ans = func(*args, **kwargs)
+                except GithubException as e:
+                    if not GithubScheduler._is_rate_limited(e) or retry == GithubScheduler.MAX_RETRY:
+                        raise
+                    self.update(e.headers)
+                    self._sleep(GithubScheduler._retry_wait(e), "rate limited")
+                    continue
+                finally:
+                    if write:
+                        with self._cond:
+                            self._last_write = time.time()
+                return ans
+        finally:
+            if not write:
+                with self._cond:
+                    self._reads_pending -= 1
+                    self._cond.notify_all()
+
+    def log_stats(self):
+        logger.info("GitHub calls: {} reads, {} writes, {} graphql, {} retries, paused {}s, quota {}/{}"
+                    .format(self.calls["read"], self.calls["write"], self.calls["graphql"], self.calls["retry"],
+                            int(self.waited), self.remaining, self.limit))
@@ -0,0 +1,110 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .logger import logger
+
+
+class HttpSession:
+    """
+    Shared http sessions, one keep-alive connection pool per host.
+    Requests have connect/read timeouts and are retried with exponential backoff
+    on connection errors and 5xx responses.
+    """
+
+    def __init__(self):
+        self.pool_size = 4
+        self.connect_timeout = 10.0
+        self.read_timeout = 60.0
+        self.retries = 3
+        self.backoff = 1.0
+
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._stats = {}
+
+    def configure(self, pool_size: int = 4, connect_timeout: float = 10.0, read_timeout: float = 60.0,
+                  retries: int = 3, backoff: float = 1.0):
+        with self._lock:
+            self.pool_size = pool_size
+            self.connect_timeout = connect_timeout
+            self.read_timeout = read_timeout
+            self.retries = retries
+            self.backoff = backoff
+            # sessions will be created again with new settings
+            for s in self._sessions.values():
+                s.close()
+            self._sessions = {}
+
+    def _new_session(self) -> requests.Session:
+        retry = Retry(total=self.retries, connect=self.retries, read=self.retries, status=self.retries,
+                      backoff_factor=self.backoff, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset(["GET", "HEAD"]), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def session(self, host: str) -> requests.Session:
+        with self._lock:
+            if host not in self._sessions.keys():
+                self._sessions[host] = self._new_session()
+            return self._sessions[host]
+
+    def _record(self, host: str, cost: float, failed: bool):
+        with self._lock:
+            if host not in self._stats.keys():
+                self._stats[host] = {"requests": 0, "errors": 0, "total": 0.0, "max": 0.0}
+            st = self._stats[host]
+            st["requests"] += 1
+            st["total"] += cost
+            st["max"] = max(st["max"], cost)
+            if failed:
+                st["errors"] += 1
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        host = urlsplit(url).hostname or ""
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+
+        start = time.time()
+        try:
+            resp = self.session(host).request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(host, time.time() - start, True)
+            raise
+        self._record(host, time.time() - start, resp.status_code >= 500)
+        return resp
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        :return: {host: {"requests": int, "errors": int, "total": float, "max": float, "mean": float}}
+        """
+        with self._lock:
+            ans = {}
+            for h, st in self._stats.items():
+                ans[h] = dict(st)
+                ans[h]["mean"] = st["total"] / st["requests"] if st["requests"] else 0.0
+            return ans
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {}
+
+    def log_stats(self):
+        for h, st in sorted(self.stats().items()):
+            logger.info("Host {}: {} requests, {} errors, mean {:.3f}s, max {:.3f}s"
+                        .format(h, st["requests"], st["errors"], st["mean"], st["max"]))
+
+
+http_session = HttpSession()